@@ -0,0 +1,227 @@
+"""
+Golden-output regression check for the panel optimizer.
+
+Runs optimize_panels on the reference inputs and compares the chosen layout
+of every side, the panel statistics and the reuse efficiency against the
+golden files in benchmarks/golden/.
+
+    python benchmarks/check_golden.py            # check, exit 1 on any failure
+    python benchmarks/check_golden.py --update   # re-record after an intended change
+
+Runtime and memory are machine-dependent, so they are not part of the golden
+files. To check them, record a baseline on the same machine before the change
+and compare against it afterwards; the check then also fails when the
+cold-cache runtime or the peak memory (tracemalloc) grows past the given
+tolerance relative to the baseline:
+
+    git stash && python benchmarks/check_golden.py --save-baseline /tmp/perf.json
+    git stash pop && python benchmarks/check_golden.py --baseline /tmp/perf.json
+
+With --required, the castings_complex.json layouts are additionally compared
+with required_output.txt and the share of matching sides is reported (for
+information; it does not fail the check).
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+sys.path.insert(0, os.path.join(ROOT, "web"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import demo_last_saved as optimizer
+from project_generator import generate_project
+from run_benchmarks import build_castings
+
+TIME_SLACK_S = 0.005
+
+REFERENCE_CASES = {
+    "castings_simple": lambda: optimizer.load_castings_from_json(os.path.join(ROOT, "castings_simple.json")),
+    "castings_complex": lambda: optimizer.load_castings_from_json(os.path.join(ROOT, "castings_complex.json")),
+    "synthetic_50": lambda: build_castings(generate_project(50, seed=1)),
+}
+
+
+def run_case(load, repeat=3):
+    """
+    Optimize a reference input from a cold cache, measuring peak memory and
+    the best of `repeat` untraced runtimes (tracemalloc slows allocation down).
+    Returns the outputs compared with the golden file and the perf numbers
+    compared with a baseline.
+    """
+    optimizer.panel_combinations_cache.clear()
+    castings = load()
+
+    tracemalloc.start()
+    plan = optimizer.create_plan(castings, 0)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    runtime = float("inf")
+    for _ in range(repeat):
+        optimizer.panel_combinations_cache.clear()
+        fresh = load()
+        start = time.perf_counter()
+        optimizer.create_plan(fresh, 0)
+        runtime = min(runtime, time.perf_counter() - start)
+
+    layouts = {
+        casting.name: {shape.name: shape.panel_layout for shape in casting.shapes}
+        for casting in castings
+    }
+    output = {
+        "layouts": layouts,
+        "panel_stats": plan["stats"]["panel_stats"],
+        "reuse_analysis": plan["stats"]["reuse_analysis"]
+    }
+    return output, {"runtime_s": runtime, "peak_memory_bytes": peak}
+
+
+def diff_layouts(golden, current):
+    """Return human-readable differences between two casting->shape->layouts maps."""
+    problems = []
+    for casting_name in sorted(set(golden) | set(current)):
+        golden_shapes = golden.get(casting_name)
+        current_shapes = current.get(casting_name)
+        if golden_shapes is None or current_shapes is None:
+            problems.append(f"{casting_name}: casting {'added' if golden_shapes is None else 'missing'}")
+            continue
+        for shape_name in sorted(set(golden_shapes) | set(current_shapes)):
+            expected = golden_shapes.get(shape_name)
+            actual = current_shapes.get(shape_name)
+            if expected is None or actual is None:
+                problems.append(f"{casting_name}/{shape_name}: shape {'added' if expected is None else 'missing'}")
+                continue
+            if len(expected) != len(actual):
+                problems.append(f"{casting_name}/{shape_name}: {len(expected)} sides -> {len(actual)}")
+                continue
+            for side_idx, (want, got) in enumerate(zip(expected, actual)):
+                if want != got:
+                    problems.append(f"{casting_name}/{shape_name} side {side_idx + 1}: {want} -> {got}")
+    return problems
+
+
+def check_case(result, golden):
+    problems = diff_layouts(golden["layouts"], result["layouts"])
+
+    if result["panel_stats"] != golden["panel_stats"]:
+        problems.append("panel statistics changed")
+    old_eff = golden["reuse_analysis"]["efficiency"]["percentage"]
+    new_eff = result["reuse_analysis"]["efficiency"]["percentage"]
+    if old_eff != new_eff:
+        problems.append(f"reuse efficiency {old_eff}% -> {new_eff}%")
+    return problems
+
+
+def check_perf(perf, baseline, time_tolerance, memory_tolerance):
+    problems = []
+    # A small absolute slack keeps millisecond-scale cases from flaking
+    if perf["runtime_s"] > baseline["runtime_s"] * time_tolerance + TIME_SLACK_S:
+        problems.append(f"runtime {baseline['runtime_s']:.4f}s -> {perf['runtime_s']:.4f}s "
+                        f"(limit x{time_tolerance})")
+    if perf["peak_memory_bytes"] > baseline["peak_memory_bytes"] * memory_tolerance:
+        problems.append(f"peak memory {baseline['peak_memory_bytes']} -> {perf['peak_memory_bytes']} bytes "
+                        f"(limit x{memory_tolerance})")
+    return problems
+
+
+def parse_required_output(path):
+    """Parse required_output.txt into casting -> shape -> list of side layouts."""
+    layouts = {}
+    casting = shape = None
+    with open(path) as f:
+        for line in f:
+            casting_match = re.match(r"\*+\s*(\S+)\s*\*+", line.strip())
+            shape_match = re.match(r"\s*Shape:\s*(\S+)", line)
+            side_match = re.match(r"\s*Side \d+ \(Length: \d+\): \[(.*)\]", line)
+            if casting_match:
+                casting = layouts.setdefault(casting_match.group(1), {})
+            elif shape_match and casting is not None:
+                shape = casting.setdefault(shape_match.group(1), [])
+            elif side_match and shape is not None:
+                shape.append([int(p) for p in side_match.group(1).split(",") if p.strip()])
+    return layouts
+
+
+def report_required(result):
+    required = parse_required_output(os.path.join(ROOT, "required_output.txt"))
+    total = matching = 0
+    for casting_name, shapes in required.items():
+        for shape_name, sides in shapes.items():
+            actual = result["layouts"].get(casting_name, {}).get(shape_name, [])
+            for side_idx, expected in enumerate(sides):
+                total += 1
+                if side_idx < len(actual) and actual[side_idx] == expected:
+                    matching += 1
+    print(f"required_output.txt: {matching}/{total} sides match exactly")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--update", action="store_true", help="re-record the golden files")
+    parser.add_argument("--save-baseline", metavar="FILE", help="record runtime/memory to FILE")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="also fail on runtime/memory regressions against FILE")
+    parser.add_argument("--time-tolerance", type=float, default=1.5,
+                        help="fail if runtime exceeds baseline x this factor")
+    parser.add_argument("--memory-tolerance", type=float, default=1.25,
+                        help="fail if peak memory exceeds baseline x this factor")
+    parser.add_argument("--required", action="store_true", help="report agreement with required_output.txt")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    os.makedirs(GOLDEN_DIR, exist_ok=True)
+    failed = False
+    measured = {}
+    for name, load in REFERENCE_CASES.items():
+        result, perf = run_case(load)
+        measured[name] = perf
+        path = os.path.join(GOLDEN_DIR, f"{name}.json")
+        timing = f"{perf['runtime_s']:.4f}s, {perf['peak_memory_bytes']} bytes peak"
+
+        if args.update:
+            with open(path, "w") as f:
+                json.dump(result, f, indent=1)
+            print(f"{name}: recorded ({timing})")
+        elif not os.path.exists(path):
+            print(f"{name}: no golden file, run with --update")
+            failed = True
+        else:
+            with open(path) as f:
+                golden = json.load(f)
+            problems = check_case(result, golden)
+            if baseline is not None:
+                if name in baseline:
+                    problems += check_perf(perf, baseline[name], args.time_tolerance, args.memory_tolerance)
+                else:
+                    print(f"{name}: not in the baseline, runtime/memory not checked")
+            status = "FAIL" if problems else "ok"
+            print(f"{name}: {status} ({timing})")
+            for problem in problems[:20]:
+                print(f"  {problem}")
+            if len(problems) > 20:
+                print(f"  ... and {len(problems) - 20} more")
+            failed = failed or bool(problems)
+
+        if args.required and name == "castings_complex":
+            report_required(result)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(measured, f, indent=1)
+        print(f"baseline written to {args.save_baseline}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
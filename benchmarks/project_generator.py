@@ -0,0 +1,80 @@
+"""
+Seeded generators for synthetic formwork projects.
+
+Side lengths follow the distribution seen in required_output.txt: mostly long
+walls between 1400 and 4900 mm in 10 mm steps, plus short returns and pillar
+widths (150-600 mm). Towers repeat a handful of floor templates, so most
+castings are exact or near copies of another casting.
+"""
+import json
+import random
+from typing import Dict, List
+
+SHORT_SIDES = [150, 230, 250, 300, 350, 450, 600]
+
+
+def random_side(rng: random.Random) -> int:
+    if rng.random() < 0.3:
+        return rng.choice(SHORT_SIDES)
+    return rng.randrange(1400, 4900, 10)
+
+
+def random_shape(rng: random.Random, name: str) -> Dict:
+    num_sides = rng.choice([2, 4, 8, 9, 12])
+    return {"name": name, "sides": [random_side(rng) for _ in range(num_sides)]}
+
+
+def generate_project(num_castings: int, seed: int = 0, num_templates: int = None,
+                     variation: float = 0.1, shapes_per_casting=(2, 6)) -> List[Dict]:
+    """
+    Generate castings in the /optimize request format
+    ({"name": ..., "shapes": [{"name": ..., "sides": [...]}]}).
+
+    Castings are copies of num_templates floor templates; with probability
+    `variation` a copied shape gets one side changed, like a one-off opening.
+    """
+    rng = random.Random(seed)
+    if num_templates is None:
+        num_templates = max(1, num_castings // 10)
+
+    templates = []
+    for t in range(num_templates):
+        count = rng.randint(*shapes_per_casting)
+        templates.append([random_shape(rng, f"shape_{t + 1}_{s + 1}") for s in range(count)])
+
+    castings = []
+    for c in range(num_castings):
+        shapes = []
+        for shape in rng.choice(templates):
+            sides = list(shape["sides"])
+            if rng.random() < variation:
+                sides[rng.randrange(len(sides))] = random_side(rng)
+            shapes.append({"name": shape["name"], "sides": sides})
+        castings.append({"name": f"casting_{c + 1}", "shapes": shapes})
+    return castings
+
+
+def to_castings_json(castings: List[Dict]) -> Dict:
+    """Convert to the casting -> shape -> side_N file format read by load_castings_from_json."""
+    return {
+        casting["name"]: {
+            shape["name"]: {f"side_{i + 1}": length for i, length in enumerate(shape["sides"])}
+            for shape in casting["shapes"]
+        }
+        for casting in castings
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic castings JSON file")
+    parser.add_argument("castings", type=int, help="number of castings")
+    parser.add_argument("output", help="output JSON path")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--templates", type=int, default=None, help="distinct floor templates")
+    args = parser.parse_args()
+
+    project = generate_project(args.castings, seed=args.seed, num_templates=args.templates)
+    with open(args.output, "w") as f:
+        json.dump(to_castings_json(project), f, indent=2)
@@ -0,0 +1,192 @@
+"""
+Benchmark the panel optimizer on synthetic projects.
+
+Times get_possible_panels (cold cache), analyze_castings, optimize_panels
+(cold and warm cache), the reuse statistics pass and, when Flask is
+installed, the /optimize endpoint end to end, both computing the result and
+answering from the result cache. Results are written as JSON so runs can be
+compared across commits:
+
+    python benchmarks/run_benchmarks.py --output before.json
+    python benchmarks/run_benchmarks.py --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "web"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import demo_last_saved as optimizer
+from project_generator import generate_project
+
+DEFAULT_SIZES = [10, 100, 500, 2000]
+
+
+def build_castings(project):
+    castings = []
+    for casting_data in project:
+        casting = optimizer.Casting(casting_data["name"])
+        for shape_data in casting_data["shapes"]:
+            casting.add_shape(optimizer.Shape(shape_data["name"], list(shape_data["sides"])))
+        castings.append(casting)
+    optimizer.dedupe_shapes(castings)
+    return castings
+
+
+def time_runs(func, repeat, setup=None):
+    """Run func `repeat` times (calling setup before each) and return timings in seconds."""
+    timings = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        func(state)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(name, size, timings, **extra):
+    return {
+        "name": name,
+        "castings": size,
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "runs": len(timings),
+        **extra
+    }
+
+
+def clear_cache():
+    optimizer.panel_combinations_cache.clear()
+
+
+def bench_size(size, seed, repeat, server=None):
+    project = generate_project(size, seed=seed)
+    lengths = sorted({length for c in project for s in c["shapes"] for length in s["sides"]})
+    results = []
+
+    def cold_panels(_):
+        for length in lengths:
+            optimizer.get_possible_panels(length)
+    results.append(summarize("get_possible_panels_cold", size,
+                             time_runs(cold_panels, repeat, setup=clear_cache),
+                             distinct_lengths=len(lengths)))
+
+    results.append(summarize("analyze_castings", size,
+                             time_runs(lambda c: optimizer.analyze_castings(c), repeat,
+                                       setup=lambda: build_castings(project))))
+
+    def cold_setup():
+        clear_cache()
+        return build_castings(project)
+    results.append(summarize("optimize_panels_cold", size,
+                             time_runs(lambda c: optimizer.optimize_panels(c, 0), repeat, setup=cold_setup)))
+    results.append(summarize("optimize_panels_warm", size,
+                             time_runs(lambda c: optimizer.optimize_panels(c, 0), repeat,
+                                       setup=lambda: build_castings(project))))
+
+    def optimized():
+        castings = build_castings(project)
+        optimizer.optimize_panels(castings, 0)
+        return castings
+
+    def statistics_pass(castings):
+        optimizer.compute_panel_statistics(castings, 0)
+    results.append(summarize("statistics", size, time_runs(statistics_pass, repeat, setup=optimized)))
+
+    if server is not None:
+        client = server.app.test_client()
+        body = {"castings": project, "primaryCasting": project[0]["name"]}
+
+        def post(_):
+            response = client.post("/optimize", json=body)
+            assert response.status_code == 200, response.get_data(as_text=True)
+            return response.get_data()
+
+        def clear_result_cache():
+            with server.plans_lock:
+                server.result_cache.clear()
+
+        # Cold: the result cache is emptied before every request, so each one
+        # runs the optimizer (comparable with runs before the cache existed).
+        # Warm: identical requests answered from the result cache.
+        response_bytes = len(post(None))
+        results.append(summarize("optimize_endpoint", size,
+                                 time_runs(post, repeat, setup=clear_result_cache),
+                                 response_bytes=response_bytes))
+        results.append(summarize("optimize_endpoint_cached", size, time_runs(post, repeat),
+                                 response_bytes=response_bytes))
+
+    return results
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["name"], r["castings"]): r for r in json.load(f)["results"]}
+    print(f"{'benchmark':<28}{'castings':>9}{'before':>12}{'after':>12}{'ratio':>8}")
+    for result in current["results"]:
+        before = baseline.get((result["name"], result["castings"]))
+        if before is None:
+            continue
+        ratio = result["median_s"] / before["median_s"] if before["median_s"] else float("inf")
+        print(f"{result['name']:<28}{result['castings']:>9}{before['median_s']:>12.4f}"
+              f"{result['median_s']:>12.4f}{ratio:>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help="project sizes in castings")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="write results JSON to this path (default: stdout)")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    parser.add_argument("--no-server", action="store_true", help="skip the /optimize endpoint")
+    args = parser.parse_args()
+
+    server = None
+    if not args.no_server:
+        try:
+            import server
+        except ImportError as e:
+            print(f"Skipping /optimize benchmark: {e}", file=sys.stderr)
+
+    results = []
+    for size in args.sizes:
+        results.extend(bench_size(size, args.seed, args.repeat, server))
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "repeat": args.repeat,
+        "results": results
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
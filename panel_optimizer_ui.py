@@ -4,10 +4,13 @@ from tkinter.scrolledtext import ScrolledText
 import json
 import threading
 from web.demo_last_saved import (
-    Casting, Shape, optimize_panels, load_castings_from_json, print_results, STANDARD_PANEL_SIZES
+    Casting, Shape, optimize_panels, load_castings_from_json, print_results, STANDARD_PANEL_SIZES,
+    compute_panel_statistics
 )
+from web.project_file import load_project, save_project
 import sys
 import io
+import contextlib
 import pandas as pd
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment
@@ -111,6 +114,10 @@ class PanelOptimizerUI:
         
         ttk.Button(control_frame, text="Run Optimization", 
                   command=self.run_optimization).pack(side='right', padx=5)
+        ttk.Button(control_frame, text="Open Project", 
+                  command=self.open_project).pack(side='right', padx=5)
+        ttk.Button(control_frame, text="Rank Primaries", 
+                  command=self.rank_primary_castings).pack(side='right', padx=5)
 
         # Initially hide manual input
         self.manual_frame.pack_forget()
@@ -128,6 +135,8 @@ class PanelOptimizerUI:
                   command=self.export_results_text).pack(side='left', padx=5)
         ttk.Button(export_frame, text="Export to Excel", 
                   command=self.export_results_excel).pack(side='left', padx=5)
+        ttk.Button(export_frame, text="Save Project", 
+                  command=self.save_project_file).pack(side='left', padx=5)
 
     def toggle_input_method(self):
         if self.input_method.get() == "json":
@@ -139,7 +148,7 @@ class PanelOptimizerUI:
 
     def browse_json(self):
         filename = filedialog.askopenfilename(
-            filetypes=[("JSON files", "*.json"), ("All files", "*.*")]
+            filetypes=[("JSON files", "*.json *.json.gz"), ("All files", "*.*")]
         )
         if filename:
             self.json_path_var.set(filename)
@@ -234,6 +243,77 @@ class PanelOptimizerUI:
             messagebox.showerror("Error", f"Failed to start optimization: {str(e)}")
             sys.stdout = sys.__stdout__
 
+    def rank_primary_castings(self):
+        """Rank all castings as primary candidates and select the best one"""
+        if not self.castings:
+            messagebox.showwarning("Warning", "No castings available")
+            return
+
+        try:
+            from web.reuse_matrix import rank_primaries
+
+            # Layouts do not depend on the primary, so any index will do here
+            if not self.optimization_complete:
+                optimize_panels(self.castings, 0)
+            ranking = rank_primaries(self.castings)["ranking"]
+        except Exception as e:
+            messagebox.showerror("Error", f"Ranking failed: {str(e)}")
+            return
+
+        lines = ["Primary casting ranking (fewest new panels first)\n"]
+        for rank, entry in enumerate(ranking, 1):
+            lines.append(f"{rank}. {entry['casting']}: {entry['new_panels']['total_new']} new panels, "
+                         f"{entry['efficiency']['percentage']:.1f}% reuse")
+        self.show_results("\n".join(lines))
+
+        self.primary_casting_select['values'] = [entry["casting"] for entry in ranking]
+        self.primary_casting_select.set(ranking[0]["casting"])
+
+    def open_project(self):
+        """Open a binary project file, reusing its stored layouts when they are still valid"""
+        filename = filedialog.askopenfilename(
+            filetypes=[("Project files", "*.cproj"), ("All files", "*.*")]
+        )
+        if not filename:
+            return
+
+        try:
+            project = load_project(filename)
+        except Exception as e:
+            messagebox.showerror("Error", f"Failed to open project: {str(e)}")
+            return
+
+        self.castings = project["castings"]
+        self.primary_idx = project["primary_idx"]
+        self.update_preview()
+        self.update_primary_casting_options()
+        self.primary_casting_select.set(self.castings[self.primary_idx].name)
+
+        # Layouts saved for the current panel configuration need no re-optimization
+        self.optimization_complete = project["optimized"]
+        if project["optimized"]:
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                print_results(self.castings, self.primary_idx, project["catalog"])
+            self.show_results(output.getvalue())
+
+    def save_project_file(self):
+        """Save castings and optimized layouts to a binary project file"""
+        if not self.optimization_complete:
+            messagebox.showwarning("Warning", "Please run optimization first")
+            return
+
+        filename = filedialog.asksaveasfilename(
+            defaultextension=".cproj",
+            filetypes=[("Project files", "*.cproj"), ("All files", "*.*")]
+        )
+        if filename:
+            try:
+                stats = compute_panel_statistics(self.castings, self.primary_idx)
+                save_project(filename, self.castings, self.primary_idx, stats)
+            except Exception as e:
+                messagebox.showerror("Error", f"Failed to save project: {str(e)}")
+
     def show_results(self, results):
         self.results_text.delete('1.0', tk.END)
         self.results_text.insert('1.0', results)
@@ -0,0 +1,6 @@
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The web modules import each other as top-level modules (web/ is the app directory)
+sys.path.insert(0, os.path.join(ROOT, "web"))
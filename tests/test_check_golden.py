@@ -0,0 +1,19 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from check_golden import diff_layouts
+
+GOLDEN = {"casting_1": {"shape_1": [[600, 400], [300]]}}
+
+
+def test_missing_and_added_sides_fail():
+    assert diff_layouts(GOLDEN, {"casting_1": {"shape_1": [[600, 400]]}}) == ["casting_1/shape_1: 2 sides -> 1"]
+    assert diff_layouts(GOLDEN, {"casting_1": {"shape_1": [[600, 400], [300], [200]]}})
+
+
+def test_changed_layout_fails():
+    assert diff_layouts(GOLDEN, {"casting_1": {"shape_1": [[600, 400], [200, 100]]}}) == \
+        ["casting_1/shape_1 side 2: [300] -> [200, 100]"]
+    assert diff_layouts(GOLDEN, GOLDEN) == []
@@ -0,0 +1,18 @@
+import demo_last_saved as optimizer
+
+
+def test_small_gcd_catalog_keeps_only_the_best_candidates():
+    # gcd(101, 250, 600) = 1, so every length up to the side is a standard split
+    catalog = optimizer.PanelCatalog([101, 250, 600], 100, 600, cost={101: 1, 250: 2, 600: 3},
+                                     objective=optimizer.CostObjective(1, 5, 1))
+    layouts = optimizer.get_possible_panels(30000, catalog)
+
+    assert len(layouts) == optimizer.STOCK_CANDIDATES
+    assert len({tuple(sorted(layout)) for layout in layouts}) == len(layouts)
+    assert all(sum(layout) == 30000 for layout in layouts)
+    assert all(catalog.min_size <= panel <= catalog.max_size for layout in layouts for panel in layout)
+    assert layouts[0] == [600] * 50
+
+    costs = catalog.objective.panel_costs(catalog)
+    scores = [catalog.objective.score(layout, costs) for layout in layouts]
+    assert scores == sorted(scores)
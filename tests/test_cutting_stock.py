@@ -0,0 +1,39 @@
+import os
+
+import demo_last_saved as optimizer
+from cutting_stock import custom_panel_demand, plan_cuts
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def floor(name):
+    casting = optimizer.Casting(name)
+    casting.add_shape(optimizer.Shape("SW1", [730, 1260]))
+    casting.add_shape(optimizer.Shape("SW2", [490]))
+    return casting
+
+
+def test_identical_floors_fabricate_one_set():
+    # The second floor reuses every panel of the first, so nothing is added
+    plan = optimizer.create_plan([floor("casting_1"), floor("casting_2")], 0)
+    demand = custom_panel_demand(plan["primary_panels"], plan["stats"])
+
+    custom_sizes = {int(size) for size in plan["stats"]["panel_stats"]["custom"]}
+    assert demand
+    assert demand == {size: count for size, count in plan["primary_panels"].items() if size in custom_sizes}
+
+
+def test_demand_adds_only_new_secondary_panels():
+    castings = optimizer.load_castings_from_json(os.path.join(ROOT, "castings_complex.json"))
+    plan = optimizer.create_plan(castings, 0)
+    demand = custom_panel_demand(plan["primary_panels"], plan["stats"])
+
+    custom_uses = sum(plan["stats"]["panel_stats"]["custom"].values())
+    custom_primary = sum(count for size, count in plan["primary_panels"].items()
+                         if str(size) in plan["stats"]["panel_stats"]["custom"])
+    assert sum(demand.values()) == custom_primary + plan["stats"]["reuse_analysis"]["totals"]["custom_new"]
+    assert sum(demand.values()) < custom_uses
+
+    cuts = plan_cuts(demand)
+    assert cuts["totals"]["pieces"] == 43
+    assert cuts["totals"]["boards"] == 21
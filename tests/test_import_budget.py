@@ -0,0 +1,43 @@
+"""
+Startup budget for the optimize-only service: importing server must be fast
+and must not load the PDF/OCR/LLM stack, which is imported lazily by the
+endpoints that need it.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEB_DIR = os.path.join(ROOT, "web")
+
+IMPORT_BUDGET_S = 1.0
+HEAVY_MODULES = ("fitz", "cv2", "paddleocr", "numpy", "google.genai", "google.generativeai")
+
+# Runs in a fresh interpreter so modules imported by other tests do not count
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import server
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed,
+                  "loaded": [name for name in %r if name in sys.modules]}))
+""" % (HEAVY_MODULES,)
+
+
+def import_server():
+    result = subprocess.run([sys.executable, "-c", PROBE], cwd=WEB_DIR, capture_output=True, text=True)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def test_import_server_is_fast_and_lazy():
+    pytest.importorskip("flask")
+    pytest.importorskip("dotenv")
+
+    # Best of three: the first run also pays for cold disk caches
+    runs = [import_server() for _ in range(3)]
+    assert runs[0]["loaded"] == []
+    assert min(run["seconds"] for run in runs) < IMPORT_BUDGET_S
@@ -0,0 +1,59 @@
+import gzip
+import io
+import json
+import os
+
+import pytest
+
+import demo_last_saved as optimizer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOCUMENT = {
+    "casting_1": {"shape é\\\"x\"": {"side_1": 123456789, "side_2": -12.5e3}},
+    "casting_2": {"s": {"side_1": 600, "side_2": [True, False, None]}},
+    "k": "a long string with \\u escapes ☃ and , : { } [ ] inside",
+}
+
+
+def items(text, chunk_size):
+    return list(optimizer._iter_json_object_items(io.StringIO(text), chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64])
+def test_chunk_boundaries_inside_numbers_and_strings(chunk_size):
+    for text in (json.dumps(DOCUMENT), json.dumps(DOCUMENT, indent=2), json.dumps({"n": 12345})):
+        assert items(text, chunk_size) == list(json.loads(text).items())
+
+
+@pytest.mark.parametrize("text", ["{}", " { } ", "{\n}\n"])
+def test_empty_object(text):
+    assert items(text, 1) == []
+
+
+@pytest.mark.parametrize("text", ["", "[]", '{"a": 1', '{"a" 1}', '{"a": 1,}'])
+def test_malformed_documents_raise(text):
+    with pytest.raises(json.JSONDecodeError):
+        items(text, 2)
+
+
+def test_gzip_file_reads_like_plain(tmp_path):
+    source = os.path.join(ROOT, "castings_complex.json")
+    compressed = tmp_path / "castings.json.gz"
+    with open(source, "rb") as f:
+        compressed.write_bytes(gzip.compress(f.read()))
+
+    def shapes(path):
+        return [(c.name, [(s.name, s.sides) for s in c.shapes]) for c in optimizer.iter_castings_from_json(path)]
+
+    assert shapes(str(compressed)) == shapes(source)
+
+
+def test_optimize_panels_from_a_stream():
+    path = os.path.join(ROOT, "castings_complex.json")
+    castings = optimizer.load_castings_from_json(path)
+    expected = optimizer.optimize_panels(castings, 0)
+
+    shared_shapes = {}
+    assert optimizer.optimize_panels(optimizer.iter_castings_from_json(path, shared_shapes), 0) == expected
+    layouts = {shape.key(): shape.panel_layout for casting in castings for shape in casting.shapes}
+    assert {key: shape.panel_layout for key, shape in shared_shapes.items()} == layouts
@@ -0,0 +1,29 @@
+import pytest
+
+import demo_last_saved as optimizer
+
+
+def test_catalog_size_limit():
+    sizes = list(range(100, 100 + 10 * (optimizer.MAX_CATALOG_SIZES + 1), 10))
+    with pytest.raises(ValueError):
+        optimizer.PanelCatalog(sizes, 100, max(sizes))
+    optimizer.PanelCatalog(sizes[:optimizer.MAX_CATALOG_SIZES], 100, max(sizes))
+
+
+def test_layout_cache_evicts_least_recently_used():
+    cache = optimizer.LayoutCache(2)
+    cache.setdefault("a", [1])
+    cache.setdefault("b", [2])
+    assert cache.get("a") == [1]
+    assert cache.setdefault("c", [3]) == [3]
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.setdefault("a", [4]) == [1]
+
+
+def test_client_catalogs_do_not_grow_the_cache_without_bound(monkeypatch):
+    monkeypatch.setattr(optimizer, "panel_combinations_cache", optimizer.LayoutCache(50))
+    for low in range(100, 200):
+        catalog = optimizer.PanelCatalog([low, 600], low, 600)
+        optimizer.get_possible_panels(1200, catalog)
+    assert len(optimizer.panel_combinations_cache) == 50
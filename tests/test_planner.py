@@ -0,0 +1,39 @@
+import os
+
+import pytest
+
+import demo_last_saved as optimizer
+from planner import OptimizeConfig, Project, optimize
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def layouts(castings):
+    return [[shape.panel_layout for shape in casting.shapes] for casting in castings]
+
+
+def test_plan_matches_create_plan():
+    path = os.path.join(ROOT, "castings_complex.json")
+    for use_stock in (False, True):
+        castings = optimizer.load_castings_from_json(path)
+        project = Project.from_castings(castings)
+        plan = optimize(project, OptimizeConfig(castings[0].name, use_stock=use_stock))
+
+        reference = optimizer.create_plan(optimizer.load_castings_from_json(path), 0, use_stock=use_stock)
+        assert layouts(plan.to_castings()) == layouts(reference["castings"])
+        assert plan.stats_dict() == reference["stats"]
+        # The caller's castings are left without layouts
+        assert all(layout == [] for shape in castings[0].shapes for layout in shape.panel_layout)
+
+
+def test_plan_stats_are_frozen():
+    castings = optimizer.load_castings_from_json(os.path.join(ROOT, "castings_simple.json"))
+    plan = optimize(Project.from_castings(castings), OptimizeConfig(castings[0].name))
+    with pytest.raises(TypeError):
+        plan.stats["panel_stats"]["standard"][600] = 0
+    with pytest.raises(AttributeError):
+        plan.stats["reuse_analysis"]["new_panels"].append({})
+
+    copy = plan.stats_dict()
+    copy["panel_stats"].clear()
+    assert plan.stats["panel_stats"]
@@ -0,0 +1,40 @@
+import io
+import os
+
+import pytest
+
+import demo_last_saved as optimizer
+from project_file import ProjectFormatError, read_project, write_project
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def project_bytes():
+    castings = optimizer.load_castings_from_json(os.path.join(ROOT, "castings_simple.json"))
+    plan = optimizer.create_plan(castings, 0)
+    buffer = io.BytesIO()
+    write_project(buffer, castings, 0, plan["stats"])
+    return buffer.getvalue()
+
+
+def test_round_trip():
+    project = read_project(project_bytes())
+    assert project["optimized"]
+
+
+def test_truncated_file_is_a_format_error():
+    data = project_bytes()
+    for size in range(len(data)):
+        with pytest.raises(ProjectFormatError):
+            read_project(data[:size])
+
+
+def test_load_endpoint_rejects_truncated_file():
+    pytest.importorskip("flask")
+    from server import app
+
+    data = project_bytes()
+    response = app.test_client().post(
+        "/project/load", data={"projectFile": (io.BytesIO(data[:len(data) // 2]), "project.cproj")})
+    assert response.status_code == 400
+    assert "project file" in response.get_json()["error"]
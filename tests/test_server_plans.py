@@ -0,0 +1,41 @@
+import pytest
+
+pytest.importorskip("flask")
+
+from server import app  # noqa: E402
+
+REQUEST = {
+    "castings": [
+        {"name": "A", "shapes": [{"name": "s1", "sides": [1200, 800, 1200, 800]}]},
+        {"name": "B", "shapes": [{"name": "s1", "sides": [1200, 800, 1200, 800]}]},
+    ],
+    "primaryCasting": "A",
+}
+ADD_C = [{"op": "add_casting", "casting": {"name": "C", "shapes": [{"name": "s2", "sides": [950]}]}}]
+
+
+def test_identical_requests_get_separate_plans():
+    client = app.test_client()
+    first = client.post("/optimize", json=REQUEST).get_json()
+    second = client.post("/optimize", json=REQUEST).get_json()
+    assert first["plan_id"] != second["plan_id"]
+
+    for plan_id in (first["plan_id"], second["plan_id"]):
+        response = client.post("/optimize/update", json={"planId": plan_id, "changes": ADD_C})
+        assert response.status_code == 200, response.get_json()
+
+    # The cached result is not affected by the edits
+    third = client.post("/optimize", json=REQUEST).get_json()
+    assert third["results"] == first["results"]
+
+
+def test_failed_update_keeps_the_stored_plan():
+    client = app.test_client()
+    plan_id = client.post("/optimize", json=REQUEST).get_json()["plan_id"]
+    changes = [{"op": "set_side", "casting": "B", "shape": "s1", "side": 1, "length": 1234},
+               {"op": "remove_casting", "casting": "nope"}]
+    assert client.post("/optimize/update", json={"planId": plan_id, "changes": changes}).status_code == 400
+
+    response = client.post("/optimize/update", json={"planId": plan_id, "changes": ADD_C})
+    assert response.status_code == 200
+    assert [casting["name"] for casting in response.get_json()["results"]["castings"]] == ["C"]
@@ -0,0 +1,73 @@
+import pytest
+
+import demo_last_saved as optimizer
+
+
+def casting(name, *shapes):
+    result = optimizer.Casting(name)
+    for shape_name, sides in shapes:
+        result.add_shape(optimizer.Shape(shape_name, list(sides)))
+    return result
+
+
+def test_duplicate_casting_names_are_rejected():
+    castings = [casting("A", ("s", [1200, 800])), casting("A", ("s", [1200, 800]))]
+    with pytest.raises(ValueError, match="Duplicate casting names: A"):
+        optimizer.create_plan(castings, 0)
+
+
+def project():
+    shared = optimizer.Shape("SW1", [730, 1260, 490])
+    first = casting("casting_1", ("SW2", [2400, 910]))
+    first.add_shape(shared)
+    second = casting("casting_2", ("SW3", [1234, 600]))
+    second.add_shape(shared)
+    third = casting("casting_3", ("SW4", [3050]))
+    return [first, second, third]
+
+
+def snapshot(plan):
+    layouts = [(c.name, [(s.name, list(s.sides), s.panel_layout) for s in c.shapes]) for c in plan["castings"]]
+    keys = ("side_frequency", "casting_panels", "primary_panels", "secondary_panels", "stats")
+    return layouts, {key: plan[key] for key in keys}
+
+
+def test_update_matches_fresh_plan():
+    plan = optimizer.create_plan(project(), 0)
+    delta = optimizer.update_plan(plan, [
+        {"op": "set_side", "casting": "casting_2", "shape": "SW1", "side": 2, "length": 1800},
+        {"op": "remove_shape", "casting": "casting_1", "shape": "SW2"},
+        {"op": "set_shape", "casting": "casting_3", "shape": "SW5", "sides": [640, 640]},
+        {"op": "add_casting", "casting": {"name": "casting_4", "shapes": [{"name": "SW6", "sides": [980]}]}},
+        {"op": "remove_casting", "casting": "casting_3"},
+    ])
+    assert delta == {"changed": ["casting_2", "casting_1", "casting_4"], "removed": ["casting_3"]}
+
+    expected = [
+        casting("casting_1", ("SW1", [730, 1260, 490])),
+        casting("casting_2", ("SW3", [1234, 600]), ("SW1", [730, 1800, 490])),
+        casting("casting_4", ("SW6", [980])),
+    ]
+    assert snapshot(plan) == snapshot(optimizer.create_plan(expected, 0))
+
+
+def test_failing_batch_leaves_plan_unchanged():
+    castings = project()
+    plan = optimizer.create_plan(castings, 0)
+    before = snapshot(plan)
+    with pytest.raises(KeyError):
+        optimizer.update_plan(plan, [
+            {"op": "set_side", "casting": "casting_2", "shape": "SW3", "side": 1, "length": 4321},
+            {"op": "remove_casting", "casting": "nope"},
+        ])
+    assert snapshot(plan) == before
+    assert plan["castings"] == castings
+
+
+def test_update_of_a_copy_leaves_the_original_intact():
+    plan = optimizer.create_plan(project(), 0)
+    before = snapshot(plan)
+    copy = dict(plan)
+    optimizer.update_plan(copy, [{"op": "set_side", "casting": "casting_1", "shape": "SW1", "side": 1, "length": 1500}])
+    assert snapshot(plan) == before
+    assert snapshot(copy) != before
@@ -0,0 +1,183 @@
+"""
+Asynchronous (ASGI) variant of the PDF extraction service.
+
+    uvicorn async_server:app --port 5001      (or: hypercorn async_server:app)
+
+Uploads are handled on the event loop. Each request's CPU-bound stages
+(opening and rasterizing the PDF, OCR) run in a thread pool, and the Gemini
+call is awaited with a timeout, so many uploads can be in flight without a
+thread per request. While one upload is in OCR the next is already being
+rasterized. Every stage has its own concurrency limit, which bounds how many
+rendered images and model calls are held in memory at once:
+
+    ASYNC_WORKERS         executor threads (default: CPUs)
+    RASTERIZE_CONCURRENCY regions rendered at once (default: 4)
+    OCR_CONCURRENCY       OCR calls at once (default: 1, the model is shared)
+
+The OCR model, OCR batching and upload limits are shared with server.py
+(extraction.py, extract_config.py).
+
+The Gemini call goes through the shared client in llm_client.py, which takes
+its concurrency, timeout and retry settings (LLM_*) from the environment.
+
+The response format and error messages match /extract-pdf in server.py.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from quart import Quart, jsonify, request
+from werkzeug.exceptions import RequestEntityTooLarge
+
+from extract_config import (
+    MAX_REQUEST_BYTES, MAX_UPLOAD_BYTES, OCR_FULL_DETECTION, PADDLE_OCR_AVAILABLE, UPLOAD_SPOOL_BYTES
+)
+from extraction import (
+    build_prompt, find_casting_rectangles, format_casting_data, get_ocr, parse_llm_response,
+    recognize_regions, render_region
+)
+from instrumentation import metrics
+from llm_client import get_llm_client
+from uploads import SpooledUpload, UploadTooLarge
+from server_logging import request_id_var, setup_logging
+
+setup_logging()
+log = logging.getLogger("server")
+
+executor = ThreadPoolExecutor(max_workers=int(os.getenv("ASYNC_WORKERS", os.cpu_count() or 4)),
+                              thread_name_prefix="extract")
+
+app = Quart(__name__)
+app.config['MAX_CONTENT_LENGTH'] = MAX_REQUEST_BYTES
+
+# Created on first use: semaphores must belong to the running event loop
+_limits = {}
+
+
+def limit(stage):
+    if stage not in _limits:
+        default = {"rasterize": "4", "ocr": "1"}[stage]
+        _limits[stage] = asyncio.Semaphore(int(os.getenv(f"{stage.upper()}_CONCURRENCY", default)))
+    return _limits[stage]
+
+
+async def run_stage(stage, func, *args):
+    """Run a blocking stage in the executor under its concurrency limit, timing it."""
+    async with limit(stage):
+        start = time.perf_counter()
+        try:
+            return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+        finally:
+            metrics.record_time("extract_stage_seconds", time.perf_counter() - start, stage=stage)
+
+
+def open_document(upload, stream):
+    """Open the upload and find its casting areas; the caller closes the returned document."""
+    upload.copy_from(stream)
+    metrics.observe("extract_upload_bytes", upload.size, storage="memory" if upload.in_memory else "disk")
+    doc = upload.open_pdf()
+    try:
+        page = doc[0]  # Assuming we're processing only the first page
+        return doc, page, find_casting_rectangles(page)
+    except BaseException:
+        doc.close()
+        raise
+
+
+@app.before_request
+async def assign_request_id():
+    request_id_var.set(request.headers.get('X-Request-ID') or uuid.uuid4().hex[:12])
+
+
+@app.after_request
+async def add_request_id_header(response):
+    response.headers['X-Request-ID'] = request_id_var.get()
+    return response
+
+
+@app.route('/extract-pdf', methods=['POST'])
+async def extract_pdf():
+    if not PADDLE_OCR_AVAILABLE:
+        return jsonify({'error': 'PaddleOCR is not installed on the server. Please install with: pip install paddleocr pillow'}), 500
+
+    try:
+        files = await request.files
+        if 'pdfFile' not in files:
+            return jsonify({'error': 'No file part'}), 400
+        pdf_file = files['pdfFile']
+        if pdf_file.filename == '':
+            return jsonify({'error': 'No selected file'}), 400
+
+        # Small uploads stay in memory, larger ones are spooled to a temporary
+        # file that is removed however the request ends
+        with SpooledUpload(MAX_UPLOAD_BYTES, UPLOAD_SPOOL_BYTES) as upload:
+            doc, page, target_rectangles = await run_stage("rasterize", open_document, upload, pdf_file.stream)
+            try:
+                if not target_rectangles:
+                    return jsonify({'error': 'Could not identify casting areas in the PDF. Please check the PDF format or try manual input.'}), 400
+
+                try:
+                    ocr = await run_stage("ocr", get_ocr)
+                except Exception as e:
+                    log.error("OCR initialization error: %s", e)
+                    return jsonify({'error': f'OCR initialization failed: {str(e)}. Please try manual input.'}), 500
+
+                # A document is not safe to render from several threads, so its
+                # regions are rendered one after another, then their text crops
+                # are recognized together in one batched OCR stage
+                images = []
+                for idx, rect in enumerate(target_rectangles):
+                    log.info("Processing rectangle %d/%d", idx + 1, len(target_rectangles))
+                    try:
+                        images.append(await run_stage("rasterize", render_region, page, rect))
+                    except Exception as e:
+                        log.warning("Error processing rectangle %d: %s", idx + 1, e)
+                        images.append(None)
+
+                # The upload and the rendered regions are the request's largest buffers
+                buffer_bytes = upload.memory_bytes + sum(img.nbytes for img in images if img is not None)
+                metrics.observe("extract_buffer_bytes", buffer_bytes)
+                log.info("Holding %.1f MB of upload and region images", buffer_bytes / (1 << 20))
+
+                regions = await run_stage("ocr", recognize_regions, ocr, images, OCR_FULL_DETECTION)
+                for idx, lines in enumerate(regions):
+                    if lines:
+                        log.info("Added casting data for rectangle %d", idx + 1)
+            finally:
+                doc.close()
+
+        casting_data = format_casting_data(regions)
+        log.debug("Final extracted casting data:\n%s", casting_data)
+        if not casting_data:
+            return jsonify({'error': 'Could not extract casting data from the PDF. The PDF might not contain readable text, or the casting format might be different. Please try manual input or a different PDF.'}), 400
+
+        llm = get_llm_client()
+        if llm is None:
+            return jsonify({'error': 'Gemini API key not configured. Please set up GEMINI_API_KEY in environment variables.'}), 500
+
+        raw_response = None
+        try:
+            raw_response = await llm.generate_async(build_prompt(casting_data))
+            json_data = parse_llm_response(raw_response)
+            log.info("Successfully processed PDF and generated JSON")
+            return jsonify(json_data)
+
+        except asyncio.TimeoutError:
+            log.error("Gemini call timed out after %ss", llm.timeout)
+            return jsonify({'error': f'Gemini processing timed out after {llm.timeout:g}s. Please try again or use manual input.'}), 504
+        except json.JSONDecodeError as e:
+            log.error("JSON parsing error: %s", e, extra={"context": {"raw_response": raw_response}})
+            return jsonify({'error': f'Failed to parse Gemini response as JSON: {str(e)}. Please try manual input.'}), 500
+        except Exception as e:
+            log.error("Error with Gemini processing: %s", e)
+            return jsonify({'error': f'Gemini processing failed: {str(e)}. Please try manual input.'}), 500
+
+    except (UploadTooLarge, RequestEntityTooLarge):
+        return jsonify({'error': f'The PDF is larger than the {MAX_UPLOAD_BYTES / (1 << 20):g} MB upload limit. Please upload a smaller file.'}), 413
+    except Exception as e:
+        log.exception("Unhandled error in extract-pdf: %s", e)
+        return jsonify({'error': f'An unexpected error occurred: {str(e)}. Please try again.'}), 500
@@ -0,0 +1,171 @@
+"""
+Cut plans for custom panels: the custom sizes a plan needs are packed into
+standard stock boards (600 mm by default) so the workshop knows how to cut
+each board and how much is wasted.
+
+Boards with the same cuts are grouped into patterns, so a plan for thousands
+of pieces stays a short list.
+"""
+from typing import Dict, List, Tuple
+
+DEFAULT_STOCK_LENGTH = 600
+
+
+def custom_panel_demand(primary_panels: Dict[int, int], stats: Dict) -> Dict[int, int]:
+    """
+    Custom panels to fabricate for a plan: the primary casting's set, which the
+    secondaries reuse, plus the new panels the secondaries need beyond it (see
+    summarize_panel_usage). primary_panels maps size -> count.
+    """
+    custom_sizes = {int(size) for size in stats["panel_stats"]["custom"]}
+    demand = {size: count for size, count in primary_panels.items() if size in custom_sizes and count > 0}
+    for panel in stats["reuse_analysis"]["new_panels"]:
+        if panel["type"] == "custom":
+            demand[panel["size"]] = demand.get(panel["size"], 0) + panel["count"]
+    return demand
+
+
+def plan_cuts(demand: Dict[int, int], stock_length: int = DEFAULT_STOCK_LENGTH,
+              kerf: int = 0, improve: bool = True) -> Dict:
+    """
+    Pack the demanded pieces (size -> count) into boards of stock_length.
+    Each cut consumes kerf mm of saw width.
+
+    The plan is built with first-fit decreasing. With improve, a second plan
+    is built pattern by pattern: each pattern is the fullest board the
+    remaining demand allows (a bounded knapsack over the board length), used as
+    many times as the demand permits. The plan with fewer boards is returned.
+    Pieces longer than a board are reported under "oversize".
+    """
+    if stock_length <= 0:
+        raise ValueError("Stock length must be positive")
+    if kerf < 0:
+        raise ValueError("Kerf cannot be negative")
+
+    oversize = {size: count for size, count in demand.items() if size > stock_length or size <= 0}
+    pieces = {size: count for size, count in demand.items() if size not in oversize and count > 0}
+
+    patterns = _first_fit_decreasing(pieces, stock_length, kerf)
+    method = "ffd"
+    if improve and pieces:
+        improved = _pattern_fill(pieces, stock_length, kerf)
+        if _board_count(improved) < _board_count(patterns):
+            patterns, method = improved, "pattern_fill"
+
+    return _summarize(patterns, pieces, oversize, stock_length, kerf, method)
+
+
+def _first_fit_decreasing(pieces: Dict[int, int], stock_length: int, kerf: int) -> List[Tuple[Tuple[int, ...], int]]:
+    open_boards = []    # [remaining capacity, cuts]
+    closed_boards = []
+    smallest = min(pieces, default=0) + kerf
+    capacity = stock_length + kerf  # the last cut needs no kerf
+
+    for size in sorted(pieces, reverse=True):
+        need = size + kerf
+        for _ in range(pieces[size]):
+            for board in open_boards:
+                if board[0] >= need:
+                    break
+            else:
+                board = [capacity, []]
+                open_boards.append(board)
+            board[0] -= need
+            board[1].append(size)
+        # Boards that cannot take even the smallest piece are done
+        still_open = []
+        for board in open_boards:
+            (still_open if board[0] >= smallest else closed_boards).append(board)
+        open_boards = still_open
+
+    return _group(board[1] for board in closed_boards + open_boards)
+
+
+def _pattern_fill(pieces: Dict[int, int], stock_length: int, kerf: int) -> List[Tuple[Tuple[int, ...], int]]:
+    remaining = dict(pieces)
+    capacity = stock_length + kerf
+    patterns = []
+    while remaining:
+        cuts = _fullest_board(remaining, capacity, kerf)
+        used = {}
+        for size in cuts:
+            used[size] = used.get(size, 0) + 1
+        repeat = min(remaining[size] // count for size, count in used.items())
+        patterns.append((tuple(sorted(cuts, reverse=True)), repeat))
+        for size, count in used.items():
+            remaining[size] -= count * repeat
+            if not remaining[size]:
+                del remaining[size]
+    return patterns
+
+
+def _fullest_board(remaining: Dict[int, int], capacity: int, kerf: int) -> List[int]:
+    """Bounded subset-sum over the board length: the cuts that fill a board best."""
+    # best[c] = (last piece, previous capacity) of a reachable fill of exactly c
+    best = {0: None}
+    for size in sorted(remaining, reverse=True):
+        need = size + kerf
+        # Binary splitting turns "up to count copies" into 0/1 items
+        count = min(remaining[size], capacity // need)
+        chunk = 1
+        while count > 0:
+            take = min(chunk, count)
+            weight = need * take
+            for filled in sorted(best, reverse=True):
+                total = filled + weight
+                if total <= capacity and total not in best:
+                    best[total] = ((size, take), filled)
+            count -= take
+            chunk *= 2
+
+    filled = max(best)
+    cuts = []
+    while best[filled] is not None:
+        (size, take), filled = best[filled]
+        cuts.extend([size] * take)
+    return cuts
+
+
+def _group(boards) -> List[Tuple[Tuple[int, ...], int]]:
+    counts = {}
+    for cuts in boards:
+        key = tuple(sorted(cuts, reverse=True))
+        counts[key] = counts.get(key, 0) + 1
+    return list(counts.items())
+
+
+def _board_count(patterns) -> int:
+    return sum(count for _, count in patterns)
+
+
+def _summarize(patterns, pieces, oversize, stock_length, kerf, method) -> Dict:
+    boards = []
+    total_waste = 0
+    for cuts, count in sorted(patterns, key=lambda p: (-p[1], p[0])):
+        used = sum(cuts) + kerf * (len(cuts) - 1)
+        waste = stock_length - used
+        total_waste += waste * count
+        boards.append({
+            "cuts": list(cuts),
+            "count": count,
+            "waste": waste,
+            "waste_pct": round(waste / stock_length * 100, 1)
+        })
+
+    board_count = _board_count(patterns)
+    material = sum((size + kerf) * count for size, count in pieces.items())
+    return {
+        "stock_length": stock_length,
+        "kerf": kerf,
+        "method": method,
+        "boards": boards,
+        "oversize": [{"size": size, "count": count} for size, count in sorted(oversize.items())],
+        "totals": {
+            "boards": board_count,
+            "pieces": sum(pieces.values()),
+            # No plan can use fewer boards than this
+            "lower_bound": -(-material // (stock_length + kerf)) if material else 0,
+            "waste_mm": total_waste,
+            "waste_pct": round(total_waste / (board_count * stock_length) * 100, 1) if board_count else 0
+        }
+    }
@@ -1,18 +1,188 @@
-import numpy as np
-from typing import List, Dict, Tuple
+from typing import List, Dict, Iterable, Iterator, Tuple
+import functools
+import gzip
+import heapq
 import itertools
 import json
+import logging
+import math
 import os
+import sys
+import threading
 import time
-from tqdm import tqdm  # For progress bars
+from collections import OrderedDict
+
+# Works both as web.demo_last_saved (Tk UI) and as a top-level module (server/CLI)
+try:
+    from .instrumentation import metrics
+except ImportError:
+    from instrumentation import metrics
 
 # Constants
 MIN_PANEL_SIZE = 100
 MAX_PANEL_SIZE = 600
 STANDARD_PANEL_SIZES = [100, 200, 300, 400, 500, 600]  # Standard panel sizes in increments of 100
+# Catalogs can come from clients; layout generation grows with the number of sizes
+MAX_CATALOG_SIZES = 32
+
+class CostObjective:
+    """
+    Ranks layouts by what they cost to build instead of the default
+    lexicographic preference (fewest custom panels, then fewest panels, ...).
+
+    A layout's score is the sum over its panels of the catalog's purchase cost
+    for the size (times purchase_weight), fabrication_cost for custom sizes and
+    handling_cost for every panel. Layouts always cover the side exactly, so
+    there is no waste term. Ties keep the default order.
+    """
+    def __init__(self, purchase_weight: float = 1.0, fabrication_cost: float = 0.0,
+                 handling_cost: float = 0.0):
+        self.purchase_weight = float(purchase_weight)
+        self.fabrication_cost = float(fabrication_cost)
+        self.handling_cost = float(handling_cost)
+    
+    def panel_costs(self, catalog: "PanelCatalog") -> Dict[int, float]:
+        """Cost of one panel of each standard size; custom sizes are priced by custom_cost."""
+        return {size: self.purchase_weight * catalog.cost.get(size, 0.0) + self.handling_cost
+                for size in catalog.sizes}
+    
+    @property
+    def custom_cost(self) -> float:
+        return self.fabrication_cost + self.handling_cost
+    
+    def score(self, layout: List[int], panel_costs: Dict[int, float]) -> float:
+        custom_cost = self.custom_cost
+        return sum(panel_costs.get(panel, custom_cost) for panel in layout)
+    
+    def key(self) -> Tuple:
+        return (self.purchase_weight, self.fabrication_cost, self.handling_cost)
+    
+    def to_dict(self) -> Dict:
+        return {
+            "purchase_weight": self.purchase_weight,
+            "fabrication_cost": self.fabrication_cost,
+            "handling_cost": self.handling_cost
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "CostObjective":
+        return cls(**{name: data[name] for name in
+                      ("purchase_weight", "fabrication_cost", "handling_cost") if name in data})
+
+class PanelCatalog:
+    """
+    The panels a site works with: standard sizes, the allowed size range for
+    custom panels and, optionally, stock on hand, cost per size and a
+    CostObjective used to rank layouts.
+    """
+    def __init__(self, sizes: List[int], min_size: int, max_size: int,
+                 stock: Dict[int, int] = None, cost: Dict[int, float] = None,
+                 objective: CostObjective = None):
+        if not sizes:
+            raise ValueError("A panel catalog needs at least one standard size")
+        if len(set(sizes)) > MAX_CATALOG_SIZES:
+            raise ValueError(f"A panel catalog can have at most {MAX_CATALOG_SIZES} standard sizes")
+        if not 0 < min_size <= max_size:
+            raise ValueError(f"Invalid panel size range {min_size}-{max_size}")
+        if any(not min_size <= size <= max_size for size in sizes):
+            raise ValueError(f"Standard sizes must lie within {min_size}-{max_size}")
+        self.sizes = tuple(sorted(set(sizes)))
+        self.min_size = min_size
+        self.max_size = max_size
+        self.stock = {int(size): int(count) for size, count in (stock or {}).items()}
+        self.cost = {int(size): float(cost) for size, cost in (cost or {}).items()}
+        self.objective = objective
+        self._standard = frozenset(self.sizes)
+    
+    def is_standard(self, size: int) -> bool:
+        return size in self._standard
+    
+    def key(self) -> Tuple:
+        """Everything that affects the generated layouts; used to key the layout cache."""
+        if self.objective is None:
+            return (self.sizes, self.min_size, self.max_size)
+        # Costs only change the ranking when an objective uses them
+        return (self.sizes, self.min_size, self.max_size,
+                tuple(sorted(self.cost.items())), self.objective.key())
+    
+    def to_dict(self) -> Dict:
+        data = {
+            "sizes": list(self.sizes),
+            "min": self.min_size,
+            "max": self.max_size,
+            "stock": {str(size): count for size, count in sorted(self.stock.items())},
+            "cost": {str(size): cost for size, cost in sorted(self.cost.items())}
+        }
+        if self.objective is not None:
+            data["objective"] = self.objective.to_dict()
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict) -> "PanelCatalog":
+        """Build a catalog from the to_dict() format; missing fields fall back to the defaults."""
+        return cls(
+            [int(size) for size in data.get("sizes", STANDARD_PANEL_SIZES)],
+            int(data.get("min", MIN_PANEL_SIZE)),
+            int(data.get("max", MAX_PANEL_SIZE)),
+            data.get("stock"),
+            data.get("cost"),
+            CostObjective.from_dict(data["objective"]) if data.get("objective") else None
+        )
+    
+    def __str__(self) -> str:
+        return f"PanelCatalog: {list(self.sizes)} ({self.min_size}-{self.max_size}mm)"
+
+DEFAULT_CATALOG = PanelCatalog(STANDARD_PANEL_SIZES, MIN_PANEL_SIZE, MAX_PANEL_SIZE)
 
-# Cache for storing previously computed panel combinations
-panel_combinations_cache = {}
+# Layouts per side length considered when optimizing against stock
+STOCK_CANDIDATES = 20
+
+# Progress is reported through this logger; it is silent unless the caller
+# configures logging (main() does, at INFO, for the interactive CLI)
+logger = logging.getLogger("panel_optimizer")
+logger.addHandler(logging.NullHandler())
+
+class LayoutCache:
+    """
+    Thread-safe LRU cache of generated layouts. Every catalog a client sends
+    adds its own keys, so the number of entries is bounded: the least
+    recently used ones are evicted past maxsize.
+    """
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+    
+    def setdefault(self, key, value):
+        """Store value unless key is already cached; returns the cached value."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            self._entries[key] = value
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                metrics.increment("panel_cache_evictions_total")
+            return value
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+# Cache for storing previously computed panel combinations,
+# keyed by (catalog.key(), length) so several catalogs can share it
+PANEL_CACHE_SIZE = 20000
+panel_combinations_cache = LayoutCache(PANEL_CACHE_SIZE)
 
 class Shape:
     def __init__(self, name: str, sides: List[int]):
@@ -23,6 +193,10 @@ class Shape:
     def get_total_length(self) -> int:
         return sum(self.sides)
     
+    def key(self) -> Tuple:
+        """Identity used for deduplication: same name and same sides."""
+        return (self.name, tuple(self.sides))
+    
     def __str__(self) -> str:
         return f"Shape: {self.name}, Sides: {self.sides}"
 
@@ -40,42 +214,55 @@ class Casting:
     def __str__(self) -> str:
         return f"Casting: {self.name}, Shapes: {len(self.shapes)}"
 
-def analyze_castings(castings: List[Casting]) -> Dict:
+def dedupe_shapes(castings: List[Casting]) -> int:
+    """
+    Make identical shapes (same name and same sides) across castings share a
+    single Shape object, so their layouts are computed and stored only once.
+    Returns the number of unique shapes.
+    """
+    unique = {}
+    for casting in castings:
+        for i, shape in enumerate(casting.shapes):
+            casting.shapes[i] = unique.setdefault(shape.key(), shape)
+    return len(unique)
+
+def analyze_castings(castings: Iterable[Casting], catalog: PanelCatalog = None) -> Dict:
     """
     Analyze all castings to identify common dimensions and optimal panel sizes.
     Returns information about preferred panel sizes for optimization.
+    Castings are read in a single pass, so an iterator such as
+    iter_castings_from_json() can be passed for very large projects.
     """
+    catalog = catalog or DEFAULT_CATALOG
     length_counts = {}
     common_divisors = {}
     
-    print("Analyzing casting dimensions...")
+    logger.info("Analyzing casting dimensions...")
     
-    # Collect all side lengths from all castings
-    all_lengths = []
+    # Count the frequency of each side length; only the counts are kept
+    total_sides = 0
     for casting in castings:
         for shape in casting.shapes:
-            all_lengths.extend(shape.sides)
-    
-    # Count frequency of each length
-    for length in all_lengths:
-        length_counts[length] = length_counts.get(length, 0) + 1
+            for length in shape.sides:
+                length_counts[length] = length_counts.get(length, 0) + 1
+            total_sides += len(shape.sides)
     
     # Find common divisors that work across multiple lengths
-    for panel_size in sorted(STANDARD_PANEL_SIZES, reverse=True):  # Start with largest panels
+    for panel_size in sorted(catalog.sizes, reverse=True):  # Start with largest panels
         divisible_count = 0
         total_panels = 0
         
-        for length in all_lengths:
+        for length, count in length_counts.items():
             # If length is divisible by panel_size or has a small remainder
             if length % panel_size == 0:
-                divisible_count += 1
-                total_panels += length // panel_size
-            elif length % panel_size <= MIN_PANEL_SIZE and length >= panel_size:
+                divisible_count += count
+                total_panels += length // panel_size * count
+            elif length % panel_size <= catalog.min_size and length >= panel_size:
                 # Almost divisible (has small remainder)
-                divisible_count += 0.5
-                total_panels += length // panel_size
+                divisible_count += 0.5 * count
+                total_panels += length // panel_size * count
         
-        efficiency = divisible_count / len(all_lengths) if all_lengths else 0
+        efficiency = divisible_count / total_sides if total_sides else 0
         common_divisors[panel_size] = {
             "efficiency": efficiency,
             "divisible_count": divisible_count,
@@ -93,16 +280,17 @@ def analyze_castings(castings: List[Casting]) -> Dict:
     
     # If we don't have enough preferred sizes, add the largest ones
     if len(preferred_sizes) < 2:
-        for size in sorted(STANDARD_PANEL_SIZES, reverse=True):
+        for size in sorted(catalog.sizes, reverse=True):
             if size not in preferred_sizes:
                 preferred_sizes.append(size)
             if len(preferred_sizes) >= 3:
                 break
     
-    # Print analysis results
-    print("\nPanel size analysis:")
-    for size, efficiency, total_panels in panel_efficiency:
-        print(f"  {size}mm: {efficiency:.2f} efficiency ({total_panels} total panels needed)")
+    # Log analysis results
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Panel size analysis:")
+        for size, efficiency, total_panels in panel_efficiency:
+            logger.info("  %smm: %.2f efficiency (%s total panels needed)", size, efficiency, total_panels)
     
     return {
         "length_counts": length_counts,
@@ -110,54 +298,84 @@ def analyze_castings(castings: List[Casting]) -> Dict:
         "panel_efficiency": panel_efficiency
     }
 
-def get_possible_panels(length: int) -> List[List[int]]:
+def get_possible_panels(length: int, catalog: PanelCatalog = None) -> List[List[int]]:
     """
-    Generate optimal panel combinations for a given length.
-    Ensures all panels are within the valid size range (MIN_PANEL_SIZE to MAX_PANEL_SIZE).
+    Return panel combinations for a given length, best first, generating and
+    caching them on first use. Results are cached per catalog (default:
+    DEFAULT_CATALOG). Cache hits/misses, generation time and the number of
+    candidates generated (a summary over all lengths) are recorded in the
+    metrics registry.
     """
+    catalog = catalog or DEFAULT_CATALOG
+    cache_key = (catalog.key(), length)
+    
     # Check cache first
-    if length in panel_combinations_cache:
-        return panel_combinations_cache[length]
+    cached = panel_combinations_cache.get(cache_key)
+    if cached is not None:
+        metrics.increment("panel_cache_hits_total")
+        return cached
+    
+    metrics.increment("panel_cache_misses_total")
+    start = time.perf_counter()
+    panels = _generate_possible_panels(length, catalog)
+    metrics.record_time("panel_generation_seconds", time.perf_counter() - start)
+    metrics.observe("panel_candidates", len(panels))
     
+    # Cache the results; threads generating the same length concurrently all
+    # end up sharing the first stored list
+    return panel_combinations_cache.setdefault(cache_key, panels)
+
+def _generate_possible_panels(length: int, catalog: PanelCatalog) -> List[List[int]]:
+    """
+    Generate optimal panel combinations for a given length.
+    Ensures all panels are within the catalog's valid size range.
+    """
+    min_size = catalog.min_size
+    max_size = catalog.max_size
+    is_standard = catalog.is_standard
     valid_panels = []
-    standard_sizes = sorted(STANDARD_PANEL_SIZES, reverse=True)  # Start with largest panels
+    standard_sizes = sorted(catalog.sizes, reverse=True)  # Start with largest panels
     
     # If length is smaller than the minimum panel size, handle this edge case
-    if length < MIN_PANEL_SIZE:
+    if length < min_size:
         # For very small lengths, we have to use the minimum size
-        valid_panels.append([MIN_PANEL_SIZE])
-        panel_combinations_cache[length] = valid_panels
+        valid_panels.append([min_size])
         return valid_panels
     
+    if catalog.objective is not None:
+        ranked = _cost_ranked_panels(length, catalog)
+        if ranked:
+            return ranked
+    
     # APPROACH 1: Maximize use of maximum-sized standard panels (600mm)
-    if length >= MAX_PANEL_SIZE:
+    if length >= max_size:
         # Calculate how many maximum-sized panels we can use
-        num_max_panels = length // MAX_PANEL_SIZE
-        remaining = length - (num_max_panels * MAX_PANEL_SIZE)
+        num_max_panels = length // max_size
+        remaining = length - (num_max_panels * max_size)
         
         if remaining == 0:
             # Perfect fit with max-sized panels
-            valid_panels.append([MAX_PANEL_SIZE] * num_max_panels)
-        elif remaining >= MIN_PANEL_SIZE:
+            valid_panels.append([max_size] * num_max_panels)
+        elif remaining >= min_size:
             # If remainder is at least the minimum size, add it as a panel
-            valid_panels.append([MAX_PANEL_SIZE] * num_max_panels + [remaining])
+            valid_panels.append([max_size] * num_max_panels + [remaining])
         else:
             # Remainder is too small - adjust by using one fewer max panel
-            # and adding standard panels that sum to (MAX_PANEL_SIZE + remaining)
-            adjusted_length = MAX_PANEL_SIZE + remaining
+            # and adding standard panels that sum to (max_size + remaining)
+            adjusted_length = max_size + remaining
             
             # Try standard panels to fill the adjusted length
             for r in range(1, 3):  # Try up to 2 standard panels
                 for combo in itertools.combinations_with_replacement(standard_sizes, r):
-                    if sum(combo) == adjusted_length and all(p >= MIN_PANEL_SIZE for p in combo):
-                        valid_panels.append([MAX_PANEL_SIZE] * (num_max_panels - 1) + list(combo))
+                    if sum(combo) == adjusted_length and all(p >= min_size for p in combo):
+                        valid_panels.append([max_size] * (num_max_panels - 1) + list(combo))
             
             # If no standard combination, try a custom panel if it's large enough
-            if not any(p for p in valid_panels if sum(p) == length) and adjusted_length >= MIN_PANEL_SIZE:
-                valid_panels.append([MAX_PANEL_SIZE] * (num_max_panels - 1) + [adjusted_length])
+            if not any(p for p in valid_panels if sum(p) == length) and adjusted_length >= min_size:
+                valid_panels.append([max_size] * (num_max_panels - 1) + [adjusted_length])
     
     # APPROACH 2: Use combinations of standard panels only
-    for r in range(1, min(8, length // MIN_PANEL_SIZE + 1)):  # Dynamic limit based on length
+    for r in range(1, min(8, length // min_size + 1)):  # Dynamic limit based on length
         for combo in itertools.combinations_with_replacement(standard_sizes, r):
             if sum(combo) == length:
                 valid_panels.append(list(combo))
@@ -173,7 +391,7 @@ def get_possible_panels(length: int) -> List[List[int]]:
                 if remaining1 == 0:
                     # Perfect fit with this panel size
                     valid_panels.append([size1] * count1)
-                elif remaining1 >= MIN_PANEL_SIZE:
+                elif remaining1 >= min_size:
                     # Try adding a second panel size
                     for size2 in standard_sizes:
                         if size2 <= remaining1:
@@ -182,15 +400,15 @@ def get_possible_panels(length: int) -> List[List[int]]:
                                 count2 = remaining1 // size2
                                 valid_panels.append([size1] * count1 + [size2] * count2)
                             # If not a perfect fit, check if remainder is at least the minimum size
-                            elif remaining1 > size2 and (remaining1 % size2) >= MIN_PANEL_SIZE:
+                            elif remaining1 > size2 and (remaining1 % size2) >= min_size:
                                 count2 = remaining1 // size2
                                 last_panel = remaining1 - (size2 * count2)
-                                if last_panel >= MIN_PANEL_SIZE:
+                                if last_panel >= min_size:
                                     valid_panels.append([size1] * count1 + [size2] * count2 + [last_panel])
     
     # APPROACH 4: For smaller lengths, try as a single panel
-    if length <= MAX_PANEL_SIZE and length >= MIN_PANEL_SIZE:
-        if length in STANDARD_PANEL_SIZES:
+    if length <= max_size and length >= min_size:
+        if is_standard(length):
             valid_panels.append([length])  # Use standard size if exact match
         else:
             valid_panels.append([length])  # Use a custom panel within size limits
@@ -198,7 +416,7 @@ def get_possible_panels(length: int) -> List[List[int]]:
     # Filter out any invalid panel combinations (outside size limits)
     valid_panels = [
         combo for combo in valid_panels 
-        if all(MIN_PANEL_SIZE <= p <= MAX_PANEL_SIZE for p in combo) and sum(combo) == length
+        if all(min_size <= p <= max_size for p in combo) and sum(combo) == length
     ]
     
     # Remove duplicates
@@ -213,109 +431,227 @@ def get_possible_panels(length: int) -> List[List[int]]:
             seen.add(combo_tuple)
     
     # Sort by optimization criteria
-    sorted_panels = sorted(
-        verified_panels,
-        key=lambda x: (
-            # Primary criteria: prefer all standard panels (no custom)
-            sum(0 if p in STANDARD_PANEL_SIZES else 1 for p in x),
-            
-            # Secondary criteria: fewer total panels
-            len(x),
-            
-            # Tertiary criteria: prefer larger panels on average
-            -sum(p for p in x) / len(x) if x else 0,
-            
-            # Quaternary criteria: prefer more of the largest standard panels
-            -sum(1 for p in x if p == MAX_PANEL_SIZE)
-        )
-    )
+    sorted_panels = sorted(verified_panels, key=lambda x: _layout_rank(x, catalog))
     
     # If we still don't have any valid panels, create a fallback
     if not sorted_panels and length > 0:
-        if length < MIN_PANEL_SIZE:
+        if length < min_size:
             # For very small lengths, we have to use the minimum size
-            sorted_panels = [[MIN_PANEL_SIZE]]
-        elif length <= MAX_PANEL_SIZE:
+            sorted_panels = [[min_size]]
+        elif length <= max_size:
             # Single panel if within size limits
             sorted_panels = [[length]]
         else:
             # For long lengths, use max-sized panels plus one more
-            max_count = length // MAX_PANEL_SIZE
-            remaining = length % MAX_PANEL_SIZE
+            max_count = length // max_size
+            remaining = length % max_size
             
-            if remaining >= MIN_PANEL_SIZE:
+            if remaining >= min_size:
                 # Remainder is valid as a panel
-                sorted_panels = [[MAX_PANEL_SIZE] * max_count + [remaining]]
+                sorted_panels = [[max_size] * max_count + [remaining]]
             else:
                 # Use fewer max panels and redistribute
-                adjusted = [MAX_PANEL_SIZE] * (max_count - 1)
-                remaining_length = MAX_PANEL_SIZE + remaining
+                adjusted = [max_size] * (max_count - 1)
+                remaining_length = max_size + remaining
                 
                 # Try to split the remaining length into valid-sized panels
                 for size in sorted(standard_sizes, reverse=True):
-                    if remaining_length >= size + MIN_PANEL_SIZE:
+                    if remaining_length >= size + min_size:
                         final_remainder = remaining_length - size
-                        if final_remainder >= MIN_PANEL_SIZE:
+                        if final_remainder >= min_size:
                             sorted_panels = [adjusted + [size, final_remainder]]
                             break
                 
                 # If no valid split found, use minimum panels
                 if not sorted_panels:
-                    # Last resort: use max_count-1 panels of MAX_PANEL_SIZE and adjust
-                    if (max_count-1) * MAX_PANEL_SIZE >= length - MIN_PANEL_SIZE:
-                        remaining = length - (max_count-1) * MAX_PANEL_SIZE
-                        sorted_panels = [[MAX_PANEL_SIZE] * (max_count-1) + [remaining]]
+                    # Last resort: use max_count-1 panels of max_size and adjust
+                    if (max_count-1) * max_size >= length - min_size:
+                        remaining = length - (max_count-1) * max_size
+                        sorted_panels = [[max_size] * (max_count-1) + [remaining]]
                     else:
-                        # Ultimate fallback: use all MIN_PANEL_SIZE panels
-                        min_count = (length + MIN_PANEL_SIZE - 1) // MIN_PANEL_SIZE  # Ceiling division
-                        sorted_panels = [[MIN_PANEL_SIZE] * min_count]
+                        # Ultimate fallback: use all min_size panels
+                        min_count = (length + min_size - 1) // min_size  # Ceiling division
+                        sorted_panels = [[min_size] * min_count]
     
-    # Cache the results
-    panel_combinations_cache[length] = sorted_panels
     return sorted_panels
 
-def optimize_panels(castings: List[Casting], primary_idx: int) -> Dict:
+def _layout_rank(x: List[int], catalog: PanelCatalog) -> Tuple:
+    """Default preference between layouts; smaller is better."""
+    return (
+        # Primary criteria: prefer all standard panels (no custom)
+        sum(0 if catalog.is_standard(p) else 1 for p in x),
+        
+        # Secondary criteria: fewer total panels
+        len(x),
+        
+        # Tertiary criteria: prefer larger panels on average
+        -sum(p for p in x) / len(x) if x else 0,
+        
+        # Quaternary criteria: prefer more of the largest standard panels
+        -sum(1 for p in x if p == catalog.max_size)
+    )
+
+def _cost_ranked_panels(length: int, catalog: PanelCatalog,
+                        max_candidates: int = STOCK_CANDIDATES) -> List[List[int]]:
+    """
+    The max_candidates best layouts for a length ranked by the catalog's
+    CostObjective, found by a dynamic program over the cost instead of by
+    scoring the heuristic candidates.
+
+    best[s / gcd] is the cheapest multiset of standard panels summing to s
+    (ties: fewer, then larger panels). Every layout is such a standard part
+    plus the fewest custom panels that cover the rest, so each reachable s
+    gives one candidate: the cheapest layout with that much standard
+    formwork. There are up to length / gcd(sizes) of them, so their ranking
+    keys are computed from the program's totals, and only the best few are
+    taken off a heap and built. Returns [] when no split works; the caller
+    then uses the heuristic search.
+    """
+    objective = catalog.objective
+    panel_costs = objective.panel_costs(catalog)
+    custom_cost = objective.custom_cost
+    min_size, max_size = catalog.min_size, catalog.max_size
+    sizes = sorted(catalog.sizes, reverse=True)
+    step = functools.reduce(math.gcd, sizes)
+
+    # Unbounded knapsack on the grid of standard sums:
+    # (cost, panels, last size, panels of max_size)
+    best = [None] * (length // step + 1)
+    best[0] = (0.0, 0, None, 0)
+    steps = [(size, size // step, panel_costs[size], int(size == max_size)) for size in sizes]
+    for cell in range(1, len(best)):
+        choice = None
+        for size, width, cost, is_max in steps:  # largest first, so ties keep larger panels
+            if width > cell:
+                continue
+            previous = best[cell - width]
+            if previous is None:
+                continue
+            candidate = (previous[0] + cost, previous[1] + 1, size, previous[3] + is_max)
+            if choice is None or candidate[:2] < choice[:2]:
+                choice = candidate
+        best[cell] = choice
+
+    def custom_pieces(cell):
+        """(size, count) of the custom panels that complete a split, or None."""
+        rest = length - cell * step
+        customs = -(-rest // max_size)  # fewest custom panels for the rest
+        if customs * min_size > rest:
+            return None  # the rest is too short for that many panels
+        # Spread the rest evenly over the custom panels (all within min-max)
+        base, extra = divmod(rest, customs) if customs else (0, 0)
+        return (base + 1, extra), (base, customs - extra)
+
+    # The sort key of each finished layout, (score, *_layout_rank), computed
+    # from the totals, followed by its split
+    ranked = []
+    for cell, entry in enumerate(best):
+        pieces = custom_pieces(cell) if entry is not None else None
+        if pieces is None:
+            continue
+        cost, panels, _, max_panels = entry
+        count = panels + pieces[0][1] + pieces[1][1]
+        ranked.append((cost + sum(panel_costs.get(size, custom_cost) * n for size, n in pieces),
+                       sum(n for size, n in pieces if not catalog.is_standard(size)),
+                       count,
+                       -length / count,
+                       -(max_panels + sum(n for size, n in pieces if size == max_size)),
+                       cell))
+
+    # Best first without sorting them all. Custom panels can have a standard
+    # size, so different splits can give the same panels; those are skipped
+    heapq.heapify(ranked)
+    candidates = []
+    seen = set()
+    while ranked and len(candidates) < max_candidates:
+        cell = heapq.heappop(ranked)[-1]
+        pieces = custom_pieces(cell)
+        layout = []
+        while cell:
+            size = best[cell][2]
+            layout.append(size)
+            cell -= size // step
+        layout.sort(reverse=True)
+        for size, n in pieces:
+            layout.extend([size] * n)
+        key = tuple(sorted(layout))
+        if key not in seen:
+            seen.add(key)
+            candidates.append(layout)
+    return candidates
+
+def collect_sides(castings: Iterable[Casting]) -> Tuple[Dict[int, List], Dict[int, int]]:
+    """
+    Read castings once and return the unique shapes (id -> [shape, number of
+    references]) and the frequency of every side length. Shapes shared between
+    castings (see dedupe_shapes) are counted once, weighted by their
+    references. Works on an iterator such as iter_castings_from_json().
+    """
+    shape_refs = {}
+    for casting in castings:
+        for shape in casting.shapes:
+            shape_refs.setdefault(id(shape), [shape, 0])[1] += 1
+    
+    side_frequency = {}
+    for shape, refs in shape_refs.values():
+        for length in shape.sides:
+            side_frequency[length] = side_frequency.get(length, 0) + refs
+    return shape_refs, side_frequency
+
+def optimize_panels(castings: Iterable[Casting], primary_idx: int, catalog: PanelCatalog = None,
+                    use_stock: bool = False) -> Dict:
     """
     Optimize panel layout to ensure 100% reuse between castings.
     Uses a pre-planning approach to ensure all panels from primary casting
-    can be reused in secondary castings.
+    can be reused in secondary castings. With use_stock, layouts are chosen to
+    minimize purchases beyond the catalog's stock (see select_stock_layouts).
+
+    Without use_stock, castings can be an iterator such as
+    iter_castings_from_json(path, shared_shapes): it is read once, and the
+    layouts are applied to its unique shapes (those of shared_shapes).
     """
-    print("\nOptimizing panel layouts...")
+    logger.info("Optimizing panel layouts...")
     start_time = time.time()
-    primary = castings[primary_idx]
-    other_castings = [c for i, c in enumerate(castings) if i != primary_idx]
+    stages = metrics.stages("optimize_stage_seconds")
+    if use_stock and not isinstance(castings, list):
+        castings = list(castings)  # select_stock_layouts reads them again
     
     # First step: Generate a "reuse plan" - what panels will we need for all castings
-    all_sides = []  # All side lengths across all castings
-    
-    # Collect all side lengths
-    print("\nStep 1/4: Collecting all side lengths across castings...")
-    for casting in castings:
-        for shape in casting.shapes:
-            all_sides.extend(shape.sides)
+    logger.info("Step 1/4: Collecting all side lengths across castings...")
     
-    # Create a frequency map of side lengths
-    side_frequency = {}
-    for length in all_sides:
-        side_frequency[length] = side_frequency.get(length, 0) + 1
+    # Only the primary casting is kept from the stream
+    found = []
+    def keep_primary(stream):
+        for i, casting in enumerate(stream):
+            if i == primary_idx:
+                found.append(casting)
+            yield casting
+    shape_refs, side_frequency = collect_sides(keep_primary(castings))
+    if not found:
+        raise IndexError(f"No casting at index {primary_idx}")
+    primary = found[0]
+    stages.mark("collect_sides")
     
     # Second step: Create a "panel bank" - pool of panels that will work for all castings
-    print("\nStep 2/4: Creating a panel plan that ensures 100% reuse...")
+    logger.info("Step 2/4: Creating a panel plan that ensures 100% reuse...")
     
     # For each unique side length, generate panel combinations
     panel_options = {}
-    for length in set(all_sides):
-        panel_options[length] = get_possible_panels(length)
+    for length in side_frequency:
+        panel_options[length] = get_possible_panels(length, catalog)
+    stages.mark("generate_options")
     
     # Third step: Select the best panel combination for each side length
     # to ensure we can achieve 100% reuse
-    print("\nStep 3/4: Selecting optimal panel combinations...")
+    logger.info("Step 3/4: Selecting optimal panel combinations...")
     
     # First, identify which panel sizes appear most frequently across all castings
     panel_bank = {}  # Will store our pool of panels
     
     # Choose panel layouts for each side length - start with most frequent sides
     selected_layouts = {}
+    if use_stock:
+        selected_layouts = select_stock_layouts(castings, primary_idx, catalog)
     for length, freq in sorted(side_frequency.items(), key=lambda x: -x[1]):
         if length not in selected_layouts and length in panel_options:
             # Choose a layout that maximizes use of standard panels
@@ -327,35 +663,114 @@ def optimize_panels(castings: List[Casting], primary_idx: int) -> Dict:
                 for panel in layouts[0]:
                     panel_bank[panel] = panel_bank.get(panel, 0) + freq
     
-    # Fourth step: Apply the selected layouts to all castings
-    print("\nStep 4/4: Applying panel layouts to all castings...")
+    stages.mark("select_layouts")
     
-    # Apply to primary casting
-    panel_counts = {}  # Will track panel usage in primary casting
+    # Fourth step: Apply the selected layouts to all castings
+    logger.info("Step 4/4: Applying panel layouts to all castings...")
     
-    for shape in primary.shapes:
+    # Apply to each unique shape once; every casting referencing it sees the layout
+    for shape, _ in shape_refs.values():
         for side_idx, side_length in enumerate(shape.sides):
             if side_length in selected_layouts:
                 shape.panel_layout[side_idx] = selected_layouts[side_length].copy()
-                
-                # Update panel counts for primary casting
-                for panel in shape.panel_layout[side_idx]:
-                    panel_counts[panel] = panel_counts.get(panel, 0) + 1
     
-    # Apply the same layouts to secondary castings
-    for casting in other_castings:
-        for shape in casting.shapes:
-            for side_idx, side_length in enumerate(shape.sides):
-                if side_length in selected_layouts:
-                    shape.panel_layout[side_idx] = selected_layouts[side_length].copy()
+    # Track panel usage in primary casting
+    panel_counts = count_casting_panels(primary)
+    stages.mark("apply_layouts")
     
     elapsed_time = time.time() - start_time
-    print(f"\nOptimization completed in {elapsed_time:.2f} seconds.")
+    logger.info("Optimization completed in %.2f seconds.", elapsed_time)
     
     return panel_counts
 
-def print_results(castings: List[Casting], primary_idx: int) -> None:
+def select_stock_layouts(castings: List[Casting], primary_idx: int, catalog: PanelCatalog = None,
+                         max_candidates: int = STOCK_CANDIDATES, max_passes: int = 10) -> Dict[int, List[int]]:
+    """
+    Choose a layout per side length that minimizes what has to be bought
+    beyond the catalog's stock. A size needs as many panels as the larger of
+    the primary casting's and the secondary castings' counts (the reuse model
+    of summarize_panel_usage); purchases are weighted by the catalog's cost
+    per size, or counted as one per panel when no cost is listed.
+
+    Starts from the best-ranked layout of every length and repeatedly switches
+    single lengths to one of their top max_candidates layouts while that lowers
+    the purchase cost, so each pass is linear in the number of distinct lengths.
+    """
+    catalog = catalog or DEFAULT_CATALOG
+    stock = catalog.stock
+    cost = catalog.cost
+
+    # How often each length occurs in the primary and in the secondaries
+    weights = {}
+    shape_refs = {}
+    for i, casting in enumerate(castings):
+        slot = 0 if i == primary_idx else 1
+        for shape in casting.shapes:
+            refs = shape_refs.setdefault(id(shape), [shape, 0, 0])
+            refs[1 + slot] += 1
+    for shape, primary_refs, secondary_refs in shape_refs.values():
+        for length in shape.sides:
+            weight = weights.setdefault(length, [0, 0])
+            weight[0] += primary_refs
+            weight[1] += secondary_refs
+
+    options = {}
+    for length in weights:
+        layouts = get_possible_panels(length, catalog)[:max_candidates]
+        options[length] = (layouts, [_layout_counts(layout) for layout in layouts])
+
+    # Panel counts per size for the primary [0] and the secondaries [1]
+    totals = ({}, {})
+    choice = {}
+    for length, (primary_weight, secondary_weight) in weights.items():
+        choice[length] = 0
+        for size, count in options[length][1][0].items():
+            totals[0][size] = totals[0].get(size, 0) + count * primary_weight
+            totals[1][size] = totals[1].get(size, 0) + count * secondary_weight
+
+    def purchase(size, primary_count, secondary_count):
+        shortfall = max(primary_count, secondary_count) - stock.get(size, 0)
+        return shortfall * cost.get(size, 1.0) if shortfall > 0 else 0
+
+    for _ in range(max_passes):
+        improved = False
+        for length, (primary_weight, secondary_weight) in sorted(weights.items(), key=lambda x: -sum(x[1])):
+            layouts, layout_counts = options[length]
+            current = layout_counts[choice[length]]
+            best_idx, best_delta = choice[length], 0
+            for idx, counts in enumerate(layout_counts):
+                if idx == choice[length]:
+                    continue
+                delta = 0
+                for size in current.keys() | counts.keys():
+                    change = counts.get(size, 0) - current.get(size, 0)
+                    if change:
+                        p, q = totals[0].get(size, 0), totals[1].get(size, 0)
+                        delta += (purchase(size, p + change * primary_weight, q + change * secondary_weight)
+                                  - purchase(size, p, q))
+                if delta < best_delta:
+                    best_idx, best_delta = idx, delta
+            if best_idx != choice[length]:
+                _add_counts(totals[0], {size: -count * primary_weight for size, count in current.items()})
+                _add_counts(totals[1], {size: -count * secondary_weight for size, count in current.items()})
+                _add_counts(totals[0], {size: count * primary_weight for size, count in layout_counts[best_idx].items()})
+                _add_counts(totals[1], {size: count * secondary_weight for size, count in layout_counts[best_idx].items()})
+                choice[length] = best_idx
+                improved = True
+        if not improved:
+            break
+
+    return {length: options[length][0][idx] for length, idx in choice.items()}
+
+def _layout_counts(layout: List[int]) -> Dict[int, int]:
+    counts = {}
+    for panel in layout:
+        counts[panel] = counts.get(panel, 0) + 1
+    return counts
+
+def print_results(castings: List[Casting], primary_idx: int, catalog: PanelCatalog = None) -> None:
     """Print the optimized panel layouts for all castings with detailed reuse analysis."""
+    catalog = catalog or DEFAULT_CATALOG
     print(f"\nResults (Primary Casting: {castings[primary_idx].name})\n")
     
     # Track panel usage by casting
@@ -372,7 +787,7 @@ def print_results(castings: List[Casting], primary_idx: int) -> None:
             for panel in panels:
                 primary_panels[panel] = primary_panels.get(panel, 0) + 1
                 all_panels[panel] = all_panels.get(panel, 0) + 1
-                if panel in STANDARD_PANEL_SIZES:
+                if catalog.is_standard(panel):
                     standard_panels[panel] = standard_panels.get(panel, 0) + 1
                 else:
                     custom_panels[panel] = custom_panels.get(panel, 0) + 1
@@ -388,7 +803,7 @@ def print_results(castings: List[Casting], primary_idx: int) -> None:
                 for panel in panels:
                     secondary_panels[panel] = secondary_panels.get(panel, 0) + 1
                     all_panels[panel] = all_panels.get(panel, 0) + 1
-                    if panel in STANDARD_PANEL_SIZES:
+                    if catalog.is_standard(panel):
                         standard_panels[panel] = standard_panels.get(panel, 0) + 1
                     else:
                         custom_panels[panel] = custom_panels.get(panel, 0) + 1
@@ -436,12 +851,12 @@ def print_results(castings: List[Casting], primary_idx: int) -> None:
     if new_panels_needed:
         print("New panels needed for secondary castings:")
         for size, count in sorted(new_panels_needed.items()):
-            panel_type = "standard" if size in STANDARD_PANEL_SIZES else "custom"
+            panel_type = "standard" if catalog.is_standard(size) else "custom"
             print(f"  Size {size}mm ({panel_type}): {count} new panels")
         
         # Calculate costs based on panel count
-        standard_count = sum(count for size, count in new_panels_needed.items() if size in STANDARD_PANEL_SIZES)
-        custom_count = sum(count for size, count in new_panels_needed.items() if size not in STANDARD_PANEL_SIZES)
+        standard_count = sum(count for size, count in new_panels_needed.items() if catalog.is_standard(size))
+        custom_count = sum(count for size, count in new_panels_needed.items() if not catalog.is_standard(size))
         total_count = standard_count + custom_count
         
         print(f"\nTotal new panels needed: {total_count}")
@@ -457,34 +872,494 @@ def print_results(castings: List[Casting], primary_idx: int) -> None:
         reuse_percentage = (reused_panel_count / total_secondary_panel_count) * 100
         print(f"\nPanel reuse efficiency: {reuse_percentage:.1f}% ({reused_panel_count} of {total_secondary_panel_count} panels reused)")
 
-def load_castings_from_json(json_file_path: str) -> List[Casting]:
-    """Load casting data from a JSON file and create Casting objects."""
-    try:
-        print(f"Loading data from {json_file_path}...")
-        with open(json_file_path, 'r') as f:
-            data = json.load(f)
-        
-        castings = []
-        for casting_name, shapes_data in data.items():
-            print(f"  Processing casting: {casting_name}")
+def count_casting_panels(casting: Casting, shape_cache: Dict = None) -> Dict[int, int]:
+    """
+    Count how many panels of each size a casting's current layouts use.
+    Pass the same shape_cache across castings to count shared shapes only once.
+    """
+    if shape_cache is None:
+        shape_cache = {}
+    counts = {}
+    for shape in casting.shapes:
+        shape_counts = shape_cache.get(id(shape))
+        if shape_counts is None:
+            shape_counts = {}
+            for panels in shape.panel_layout:
+                for panel in panels:
+                    shape_counts[panel] = shape_counts.get(panel, 0) + 1
+            shape_cache[id(shape)] = shape_counts
+        _add_counts(counts, shape_counts)
+    return counts
+
+def summarize_panel_usage(primary_panels: Dict[int, int], secondary_panels: Dict[int, int],
+                          catalog: PanelCatalog = None) -> Dict:
+    """
+    Build the panel statistics and reuse analysis from per-size panel counts
+    of the primary casting and of all secondary castings combined. When the
+    catalog lists stock or costs, the reuse analysis also reports how many
+    panels must be bought beyond the stock on hand and what they cost.
+    """
+    catalog = catalog or DEFAULT_CATALOG
+    all_panels = dict(primary_panels)
+    for panel, count in secondary_panels.items():
+        all_panels[panel] = all_panels.get(panel, 0) + count
+
+    panel_stats = {"standard": {}, "custom": {}}
+    for size, count in all_panels.items():
+        if catalog.is_standard(size):
+            panel_stats["standard"][str(size)] = count
+        else:
+            panel_stats["custom"][str(size)] = count
+
+    panel_stats["totals"] = {
+        "total_types": len(all_panels),
+        "standard_types": len(panel_stats["standard"]),
+        "custom_types": len(panel_stats["custom"])
+    }
+
+    reuse_analysis = {
+        "new_panels": [],
+        "totals": {
+            "standard_new": 0,
+            "custom_new": 0,
+            "total_new": 0
+        }
+    }
+
+    # New panels are whatever the secondary castings need beyond the primary's stock
+    for panel, count in secondary_panels.items():
+        available = primary_panels.get(panel, 0)
+        if count > available:
+            new_count = count - available
+            panel_type = "standard" if catalog.is_standard(panel) else "custom"
+            reuse_analysis["new_panels"].append({
+                "size": panel,
+                "type": panel_type,
+                "count": new_count
+            })
+            reuse_analysis["totals"][f"{panel_type}_new"] += new_count
+
+    reuse_analysis["totals"]["total_new"] = (
+        reuse_analysis["totals"]["standard_new"] +
+        reuse_analysis["totals"]["custom_new"]
+    )
+
+    total_secondary = sum(secondary_panels.values())
+    reused = total_secondary - reuse_analysis["totals"]["total_new"]
+    reuse_analysis["efficiency"] = {
+        "percentage": round((reused / total_secondary * 100), 1) if total_secondary > 0 else 0,
+        "reused_panels": reused,
+        "total_panels": total_secondary
+    }
+
+    if catalog.stock or catalog.cost:
+        reuse_analysis["inventory"] = _inventory_summary(primary_panels, secondary_panels, catalog)
+
+    return {"panel_stats": panel_stats, "reuse_analysis": reuse_analysis}
+
+def _inventory_summary(primary_panels: Dict[int, int], secondary_panels: Dict[int, int],
+                       catalog: PanelCatalog) -> Dict:
+    """
+    Compare the panels the project needs (the primary's set plus the new
+    panels for the secondaries) with the catalog's stock and costs, including
+    the stock left unused.
+    """
+    sizes = []
+    to_buy_total = 0
+    leftover_total = 0
+    cost_total = 0.0
+    for size in sorted(set(primary_panels) | set(secondary_panels) | set(catalog.stock)):
+        required = max(primary_panels.get(size, 0), secondary_panels.get(size, 0))
+        on_hand = catalog.stock.get(size, 0)
+        to_buy = max(0, required - on_hand)
+        leftover = max(0, on_hand - required)
+        cost = to_buy * catalog.cost.get(size, 0)
+        sizes.append({"size": size, "required": required, "on_hand": on_hand,
+                      "to_buy": to_buy, "leftover": leftover, "cost": cost})
+        to_buy_total += to_buy
+        leftover_total += leftover
+        cost_total += cost
+    return {"sizes": sizes, "totals": {"to_buy": to_buy_total, "leftover": leftover_total, "cost": cost_total}}
+
+def compute_panel_statistics(castings: List[Casting], primary_idx: int, catalog: PanelCatalog = None) -> Dict:
+    """Panel statistics and reuse analysis for castings whose layouts are already applied."""
+    shape_cache = {}
+    primary_panels = count_casting_panels(castings[primary_idx], shape_cache)
+    secondary_panels = {}
+    for i, casting in enumerate(castings):
+        if i != primary_idx:
+            _add_counts(secondary_panels, count_casting_panels(casting, shape_cache))
+    return summarize_panel_usage(primary_panels, secondary_panels, catalog)
+
+def consolidate_custom_panels(panel_counts: Dict[int, int], tolerance: int = 50,
+                              catalog: PanelCatalog = None) -> Dict:
+    """
+    Group the custom panel sizes of a plan into a small set of fabricated
+    widths. A custom panel of size s is built at width w (s - tolerance <= w <= s)
+    and the gap s - w is closed with a filler strip.
+
+    Sizes within tolerance above a standard size use that standard panel.
+    The rest are clustered in one sweep over the sorted sizes: each cluster
+    starts at its smallest size, which becomes the fabricated width, and takes
+    every size up to width + tolerance. This greedy cover yields the fewest
+    widths possible for the tolerance, in O(n log n) for n distinct sizes.
+
+    panel_counts maps size -> count (e.g. primary plus secondary panels).
+    Returns the size mapping, the resulting widths and the change in distinct
+    custom types and in pieces (one filler per panel that was shortened).
+    """
+    catalog = catalog or DEFAULT_CATALOG
+    custom_sizes = sorted(size for size in panel_counts if not catalog.is_standard(size))
+    standard_sizes = catalog.sizes  # sorted ascending
+
+    mapping = {}
+    remaining = []
+    j = 0
+    for size in custom_sizes:
+        # Largest standard size not above this custom size
+        while j < len(standard_sizes) and standard_sizes[j] <= size:
+            j += 1
+        if j and size - standard_sizes[j - 1] <= tolerance:
+            mapping[size] = standard_sizes[j - 1]
+        else:
+            remaining.append(size)
+
+    widths = []
+    for size in remaining:
+        if not widths or size - widths[-1] > tolerance:
+            widths.append(size)
+        mapping[size] = widths[-1]
+
+    fillers = {}
+    for size, width in mapping.items():
+        if width != size:
+            fillers[size - width] = fillers.get(size - width, 0) + panel_counts[size]
+
+    return {
+        "tolerance": tolerance,
+        "mapping": [{"size": size, "width": mapping[size], "filler": size - mapping[size],
+                     "count": panel_counts[size]} for size in custom_sizes],
+        "widths": widths,
+        "fillers": [{"size": size, "count": count} for size, count in sorted(fillers.items())],
+        "totals": {
+            "custom_types_before": len(custom_sizes),
+            "custom_types_after": len(widths),
+            "added_pieces": sum(fillers.values())
+        }
+    }
+
+def _add_counts(target: Dict[int, int], counts: Dict[int, int], sign: int = 1) -> None:
+    """Add (or with sign=-1, subtract) per-size counts into target, dropping zeros."""
+    for key, count in counts.items():
+        new_count = target.get(key, 0) + sign * count
+        if new_count:
+            target[key] = new_count
+        else:
+            target.pop(key, None)
+
+def _casting_side_counts(casting: Casting) -> Dict[int, int]:
+    counts = {}
+    for shape in casting.shapes:
+        for length in shape.sides:
+            counts[length] = counts.get(length, 0) + 1
+    return counts
+
+def _apply_layouts(casting: Casting, catalog: PanelCatalog = None, selected: Dict = None,
+                   shapes: Dict = None) -> None:
+    """
+    Assign the best layout for each side length of a single casting, or the
+    layout in selected (length -> layout) where there is one. With shapes
+    (id -> Shape), only those of the casting's shapes are laid out.
+    """
+    selected = selected or {}
+    for shape in casting.shapes:
+        if shapes is not None and id(shape) not in shapes:
+            continue
+        shape.panel_layout = [
+            (selected.get(length) or get_possible_panels(length, catalog)[0]).copy()
+            for length in shape.sides
+        ]
+
+def create_plan(castings: List[Casting], primary_idx: int, catalog: PanelCatalog = None,
+                use_stock: bool = False) -> Dict:
+    """
+    Run a full optimization and keep the bookkeeping needed to update it
+    incrementally with update_plan() afterwards. The bookkeeping is keyed by
+    casting name, so the names must be unique.
+    """
+    names = [casting.name for casting in castings]
+    if len(set(names)) != len(names):
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        raise ValueError(f"Duplicate casting names: {', '.join(duplicates)}")
+    catalog = catalog or DEFAULT_CATALOG
+    optimize_panels(castings, primary_idx, catalog, use_stock)
+
+    plan = {
+        "castings": castings,
+        "catalog": catalog,
+        "selected_layouts": {},
+        "primary": castings[primary_idx].name,
+        "side_frequency": {},
+        "casting_panels": {},
+        "primary_panels": {},
+        "secondary_panels": {}
+    }
+    shape_cache = {}
+    for casting in castings:
+        _add_counts(plan["side_frequency"], _casting_side_counts(casting))
+        counts = count_casting_panels(casting, shape_cache)
+        plan["casting_panels"][casting.name] = counts
+        target = "primary_panels" if casting.name == plan["primary"] else "secondary_panels"
+        _add_counts(plan[target], counts)
+        # Layouts chosen against stock are kept so edited castings reuse them
+        if use_stock:
+            for shape in casting.shapes:
+                for length, panels in zip(shape.sides, shape.panel_layout):
+                    plan["selected_layouts"][length] = panels
+
+    plan["stats"] = summarize_panel_usage(plan["primary_panels"], plan["secondary_panels"], catalog)
+    return plan
+
+def update_plan(plan: Dict, changes: List[Dict]) -> Dict:
+    """
+    Apply a list of edits to a plan built by create_plan(), re-optimizing only
+    the castings that were touched and updating the reuse statistics as deltas.
+
+    Each change is a dict with an "op" key:
+      {"op": "add_casting", "casting": {"name": ..., "shapes": [{"name": ..., "sides": [...]}]}}
+      {"op": "remove_casting", "casting": name}
+      {"op": "set_shape", "casting": name, "shape": name, "sides": [...]}   (adds or replaces)
+      {"op": "remove_shape", "casting": name, "shape": name}
+      {"op": "set_side", "casting": name, "shape": name, "side": 1-based index, "length": value}
+
+    The batch is atomic: edited castings and shapes are copies, and the plan's
+    entries are only replaced once every change has been applied, so a
+    failing change leaves the plan as it was. Objects already in the plan are
+    never modified, so updating a shallow copy (dict(plan)) leaves the
+    original plan intact for anyone still reading it.
+
+    Returns a dict with the names of the changed and removed castings.
+    """
+    castings = {casting.name: casting for casting in plan["castings"]}
+    side_frequency = dict(plan["side_frequency"])
+    casting_panels = dict(plan["casting_panels"])
+    totals = {"primary_panels": dict(plan["primary_panels"]),
+              "secondary_panels": dict(plan["secondary_panels"])}
+    touched = {}   # name -> (edited copy of the casting, panel counts before the edit)
+    new_shapes = {}  # id -> shape created by this batch; only these need layouts
+    removed = []
+
+    def take(name):
+        if name not in castings:
+            raise KeyError(f"Unknown casting: {name}")
+        if name not in touched:
+            original = castings[name]
+            casting = Casting(name)
+            casting.shapes = list(original.shapes)
+            castings[name] = casting
+            touched[name] = (casting, casting_panels.get(name, {}))
+            _add_counts(side_frequency, _casting_side_counts(original), -1)
+        return touched[name][0]
+
+    def new_shape(name, sides):
+        shape = Shape(name, list(sides))
+        new_shapes[id(shape)] = shape
+        return shape
+
+    def find_shape(casting, shape_name):
+        for shape in casting.shapes:
+            if shape.name == shape_name:
+                return shape
+        raise KeyError(f"Unknown shape {shape_name} in casting {casting.name}")
+
+    def own_shape(casting, shape_name):
+        # Shapes may be shared with other castings or plans, so edit a private copy
+        shape = find_shape(casting, shape_name)
+        if id(shape) not in new_shapes:
+            copy = new_shape(shape.name, shape.sides)
+            casting.shapes[casting.shapes.index(shape)] = copy
+            shape = copy
+        return shape
+
+    for change in changes:
+        op = change["op"]
+        if op == "add_casting":
+            data = change["casting"]
+            if data["name"] in castings:
+                raise ValueError(f"Casting already exists: {data['name']}")
+            casting = Casting(data["name"])
+            for shape_data in data.get("shapes", []):
+                casting.add_shape(new_shape(shape_data["name"], shape_data["sides"]))
+            castings[casting.name] = casting
+            touched[casting.name] = (casting, {})
+        elif op == "remove_casting":
+            name = change["casting"]
+            if name == plan["primary"]:
+                raise ValueError("The primary casting cannot be removed")
+            take(name)
+            del touched[name]
+            del castings[name]
+            _add_counts(totals["secondary_panels"], casting_panels.pop(name, {}), -1)
+            removed.append(name)
+        elif op == "set_shape":
+            casting = take(change["casting"])
+            sides = list(change["sides"])
+            try:
+                shape = own_shape(casting, change["shape"])
+                shape.sides = sides
+                shape.panel_layout = [[] for _ in sides]
+            except KeyError:
+                casting.add_shape(new_shape(change["shape"], sides))
+        elif op == "remove_shape":
+            casting = take(change["casting"])
+            casting.shapes.remove(find_shape(casting, change["shape"]))
+        elif op == "set_side":
+            casting = take(change["casting"])
+            shape = own_shape(casting, change["shape"])
+            side = change["side"]
+            if not 1 <= side <= len(shape.sides):
+                raise KeyError(f"Unknown side {side} of shape {shape.name} in casting {casting.name}")
+            shape.sides[side - 1] = change["length"]
+        else:
+            raise ValueError(f"Unknown change op: {op}")
+
+    # Lay out the new shapes of the touched castings and swap their panel counts
+    for name, (casting, old_counts) in touched.items():
+        _apply_layouts(casting, plan["catalog"], plan["selected_layouts"], new_shapes)
+        new_counts = count_casting_panels(casting)
+        target = totals["primary_panels" if name == plan["primary"] else "secondary_panels"]
+        _add_counts(target, old_counts, -1)
+        _add_counts(target, new_counts)
+        casting_panels[name] = new_counts
+        _add_counts(side_frequency, _casting_side_counts(casting))
+
+    stats = summarize_panel_usage(totals["primary_panels"], totals["secondary_panels"], plan["catalog"])
+    plan.update(castings=list(castings.values()), side_frequency=side_frequency,
+                casting_panels=casting_panels, stats=stats, **totals)
+    return {"changed": list(touched), "removed": removed}
+
+def _open_castings_file(json_file_path: str):
+    """Open a castings JSON file as text, transparently handling gzip compression."""
+    with open(json_file_path, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(json_file_path, 'rt', encoding='utf-8')
+    return open(json_file_path, 'r', encoding='utf-8')
+
+def _iter_json_object_items(f, chunk_size: int = 65536) -> Iterator[Tuple[str, object]]:
+    """
+    Yield the (key, value) pairs of the top-level JSON object in a text file,
+    decoding one value at a time so only the current value is held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+
+    def read_more():
+        nonlocal buf, pos, eof
+        # Read at least as much as is buffered so a large value is not
+        # re-parsed from the start once per chunk
+        chunk = f.read(max(chunk_size, len(buf) - pos))
+        if not chunk:
+            eof = True
+        buf = buf[pos:] + chunk
+        pos = 0
+
+    def skip_whitespace():
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buf) or eof:
+                return
+            read_more()
+
+    def decode():
+        nonlocal pos
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                read_more()
+                continue
+            # A number or literal ending exactly at the buffer end may be cut short
+            if end == len(buf) and not eof and buf[end - 1] not in '"}]':
+                read_more()
+                continue
+            pos = end
+            return value
+
+    def expect(char):
+        nonlocal pos
+        skip_whitespace()
+        if pos >= len(buf) or buf[pos] != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", buf, pos)
+        pos += 1
+
+    expect('{')
+    skip_whitespace()
+    if pos < len(buf) and buf[pos] == '}':
+        return
+    while True:
+        skip_whitespace()
+        key = decode()
+        expect(':')
+        skip_whitespace()
+        yield key, decode()
+
+        skip_whitespace()
+        if pos < len(buf) and buf[pos] == ',':
+            pos += 1
+        else:
+            expect('}')
+            return
+
+def iter_castings_from_json(json_file_path: str, shared_shapes: Dict = None) -> Iterator[Casting]:
+    """
+    Yield Casting objects one at a time from a (optionally gzip-compressed)
+    casting -> shape -> side_N JSON file, without loading the whole document.
+    Pass a dict as shared_shapes to let identical shapes share one object, as
+    dedupe_shapes() does. The iterator can be fed straight to analyze_castings(),
+    collect_sides() or optimize_panels().
+    """
+    # Checked once so the per-shape loop pays nothing when debug is off
+    debug = logger.isEnabledFor(logging.DEBUG)
+    with _open_castings_file(json_file_path) as f:
+        for casting_name, shapes_data in _iter_json_object_items(f):
+            if debug:
+                logger.debug("  Processing casting: %s", casting_name)
             casting = Casting(casting_name)
             
             for shape_name, sides_data in shapes_data.items():
                 # Extract side lengths from the sides data
                 sides = [length for _, length in sides_data.items()]
                 shape = Shape(shape_name, sides)
+                if shared_shapes is not None:
+                    shape = shared_shapes.setdefault(shape.key(), shape)
                 casting.add_shape(shape)
-                print(f"    Added shape: {shape_name} with {len(sides)} sides")
+                if debug:
+                    logger.debug("    Added shape: %s with %d sides", shape_name, len(sides))
             
-            castings.append(casting)
-        
-        print(f"Successfully loaded {len(castings)} castings.")
+            yield casting
+
+def load_castings_from_json(json_file_path: str) -> List[Casting]:
+    """Load casting data from a JSON file (optionally gzip-compressed) and create Casting objects."""
+    try:
+        logger.info("Loading data from %s...", json_file_path)
+        shared_shapes = {}
+        castings = list(iter_castings_from_json(json_file_path, shared_shapes))
+        logger.info("Successfully loaded %d castings (%d unique shapes).", len(castings), len(shared_shapes))
         return castings
     except Exception as e:
-        print(f"Error loading JSON file: {e}")
+        logger.error("Error loading JSON file: %s", e)
         return []
 
 def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s", stream=sys.stdout)
+    
     print("Formwork Panel Optimization System")
     print("==================================")
     
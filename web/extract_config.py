@@ -0,0 +1,31 @@
+"""
+Settings of the PDF extraction pipeline, shared by server.py and
+async_server.py so the two servers cannot drift apart. Values come from the
+environment, after the project's .env file has been loaded:
+
+    OCR_BATCH_SIZE    text crops per recognizer batch (default: 16)
+    OCR_MODE          crops (default), or full to run PaddleOCR's detector on
+                      whole regions instead of recognizing pre-detected crops
+    MAX_UPLOAD_MB     largest accepted PDF (default: 50)
+    UPLOAD_SPOOL_MB   uploads up to this size stay in memory (default: 8)
+"""
+import importlib.util
+import os
+
+from dotenv import load_dotenv
+
+# The .env file sits next to the project directory
+load_dotenv(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), '.env'))
+
+# Only checked for here: the OCR stack is imported inside the functions that use it
+PADDLE_OCR_AVAILABLE = all(
+    importlib.util.find_spec(module) is not None for module in ('paddleocr', 'PIL')
+)
+
+OCR_BATCH_SIZE = int(os.getenv("OCR_BATCH_SIZE", "16"))
+OCR_FULL_DETECTION = os.getenv("OCR_MODE", "crops") == "full"
+
+MAX_UPLOAD_BYTES = int(float(os.getenv("MAX_UPLOAD_MB", "50")) * (1 << 20))
+UPLOAD_SPOOL_BYTES = int(float(os.getenv("UPLOAD_SPOOL_MB", "8")) * (1 << 20))
+MAX_FORM_OVERHEAD = 64 * 1024  # multipart boundaries and headers around the file
+MAX_REQUEST_BYTES = MAX_UPLOAD_BYTES + MAX_FORM_OVERHEAD
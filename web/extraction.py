@@ -0,0 +1,363 @@
+"""
+Stages of the PDF casting extraction used by the /extract-pdf endpoints:
+finding the casting regions on the drawing, rasterizing them, turning OCR
+results into "NAME : WxH" lines, and converting those lines to castings JSON
+through the LLM.
+
+OCR runs recognition only: text boxes are found on the rendered regions with
+OpenCV morphology (find_text_boxes), and the crops of all regions go to the
+recognizer together, in batches. PaddleOCR's full detection is kept as the
+fallback for regions where that finds nothing.
+
+The stages are plain blocking functions, so the Flask server calls them in
+sequence and the async server (async_server.py) runs them in executors.
+PyMuPDF, OpenCV and NumPy are imported inside the functions that need
+them, keeping them out of optimize-only processes.
+"""
+import json
+import logging
+import math
+import os
+import re
+import threading
+from typing import List, Tuple
+
+try:
+    from .extract_config import OCR_BATCH_SIZE
+    from .instrumentation import metrics
+except ImportError:
+    from extract_config import OCR_BATCH_SIZE
+    from instrumentation import metrics
+
+log = logging.getLogger("server")
+
+MIN_AREA = 5000          # smallest casting rectangle, in PDF points squared
+MAX_REGIONS = 4          # casting rectangles processed per drawing
+RENDER_DPI = 300
+MAX_RENDER_PIXELS = 16_000_000  # per region; 48 MB as RGB
+MIN_CONFIDENCE = 0.5
+TARGET_COLOR = (1.0, 1.0, 0.49803900718688965)  # stroke colour of casting outlines
+
+# Text box detection on RENDER_DPI images; sizes in pixels
+TEXT_MIN_HEIGHT = 10     # shorter side of a text box
+TEXT_MAX_HEIGHT = 150
+LINE_MIN_LENGTH = 100    # longer straight strokes are drawing lines, not text
+TEXT_DILATION = (9, 3)   # joins the characters of a label into one box
+CROP_PADDING = 4
+ROW_TOLERANCE = 10       # boxes whose tops differ by less are on the same row
+
+PROMPT_TEMPLATE = """
+            You are a highly accurate JSON generator.
+
+            You will be given casting data in the following format:
+            Casting N :
+            SHAPE_NAME : WIDTHxHEIGHT
+
+            Your task is to convert this to a JSON with this structure:
+
+            {{
+              "casting_1": {{
+                "SW2": {{
+                  "side_1": 4750,
+                  "side_2": 250
+                }}
+              }},
+              "casting_2": {{
+                "SW3": {{
+                  "side_1": 1200,
+                  "side_2": 600
+                }}
+              }}
+            }}
+
+            Rules:
+            - Use the shape name (e.g., SW2, LSW4) as keys.
+            - Parse the sizes into integers: width → side_1, height → side_2.
+            - Handle various dimension separators (x, X, *, etc.)
+            - Remove any spaces or non-numeric characters from dimensions
+            - Use JSON syntax only — no explanations, comments, or extra text.
+            - If multiple castings exist, number them as casting_1, casting_2, etc.
+
+            Now convert the following data into JSON:
+
+            {casting_data}
+            """
+
+
+# PaddleOCR models are large, so one instance per process is shared between
+# requests. Paddle predictors are not documented as thread-safe, so callers
+# serialize their OCR calls with ocr_lock (or an equivalent limit).
+_ocr = None
+_ocr_init_lock = threading.Lock()
+ocr_lock = threading.Lock()
+
+
+def get_ocr():
+    """Return the shared PaddleOCR instance, creating it on first use."""
+    global _ocr
+    with _ocr_init_lock:
+        if _ocr is None:
+            from paddleocr import PaddleOCR
+
+            # Avoid the duplicate OpenMP runtime error
+            os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
+            log.info("Initializing PaddleOCR...")
+            with metrics.timer("extract_stage_seconds", stage="ocr_init"):
+                _ocr = PaddleOCR(use_angle_cls=True, lang='en', show_log=False, rec_batch_num=OCR_BATCH_SIZE)
+            log.info("PaddleOCR initialized successfully")
+        return _ocr
+
+
+def is_target_color(color, target=TARGET_COLOR, tol=0.05):
+    """Check if color is within tolerance of target color"""
+    if color is None:
+        return False
+    return all(abs(c - t) < tol for c, t in zip(color, target))
+
+
+def find_casting_rectangles(page) -> List:
+    """
+    Locate the casting regions of a drawing page: rectangles stroked in the
+    target colour, else in any bright colour, else the largest rectangles.
+    Returns at most MAX_REGIONS rectangles, largest first.
+    """
+    drawings = page.get_drawings()
+    log.info("Found %d drawings in PDF", len(drawings))
+
+    def rectangles(drawing):
+        for item in drawing["items"]:
+            if item[0] == "re" and item[1].width * item[1].height >= MIN_AREA:
+                yield item[1]
+
+    target_rectangles = [rect for drawing in drawings if is_target_color(drawing.get("color"))
+                         for rect in rectangles(drawing)]
+    log.info("Found %d target colored rectangles", len(target_rectangles))
+
+    # Process with more lenient color matching if needed
+    if not target_rectangles:
+        for drawing in drawings:
+            stroke_color = drawing.get("color")
+            if stroke_color and any(c > 0.9 for c in stroke_color):  # Any bright color
+                target_rectangles.extend(rectangles(drawing))
+        log.info("After lenient matching: Found %d bright colored rectangles", len(target_rectangles))
+
+    # Last resort: get largest rectangles regardless of color
+    if not target_rectangles:
+        all_rectangles = [rect for drawing in drawings for rect in rectangles(drawing)]
+        all_rectangles.sort(key=lambda r: r.width * r.height, reverse=True)
+        target_rectangles = all_rectangles[:MAX_REGIONS]
+        log.info("Fallback: Selected %d largest rectangles", len(target_rectangles))
+
+    target_rectangles.sort(key=lambda r: r.width * r.height, reverse=True)
+    return target_rectangles[:MAX_REGIONS]
+
+
+def render_region(page, rect, dpi: int = RENDER_DPI, max_pixels: int = MAX_RENDER_PIXELS):
+    """
+    Rasterize a page region to an RGB NumPy array (what PaddleOCR expects).
+    Regions that would exceed max_pixels are rendered at a lower resolution,
+    which caps the memory a single region can take.
+    """
+    import cv2
+    import numpy as np
+
+    pixels = rect.width * rect.height * (dpi / 72) ** 2
+    if pixels > max_pixels:
+        dpi = int(72 * math.sqrt(max_pixels / (rect.width * rect.height)))
+        log.info("Region too large for %d pixels, rendering at %d dpi", max_pixels, dpi)
+
+    pix = page.get_pixmap(clip=rect, dpi=dpi)
+    # The pixmap samples are used directly, without a PNG round-trip
+    img_array = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+
+    # Ensure image is in RGB format (and writable: the samples buffer is not)
+    if pix.n == 4:  # RGBA
+        img_array = cv2.cvtColor(img_array, cv2.COLOR_RGBA2RGB)
+    elif pix.n == 1:  # Grayscale
+        img_array = cv2.cvtColor(img_array, cv2.COLOR_GRAY2RGB)
+    else:
+        img_array = img_array.copy()
+    return img_array
+
+
+def find_text_boxes(img_array) -> List[Tuple[int, int, int, int]]:
+    """
+    Locate text on a rendered region without the OCR detector: drawing lines
+    are removed from the binarized image, the remaining ink is dilated so the
+    characters of a label merge, and each connected component of text size
+    becomes an (x, y, w, h) box. Boxes are in reading order, like PaddleOCR's.
+    """
+    import cv2
+
+    gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+    _, ink = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+
+    # Long horizontal and vertical strokes (outlines, dimension lines) would
+    # otherwise join neighbouring labels into one component
+    lines = cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (LINE_MIN_LENGTH, 1)))
+    lines |= cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, (1, LINE_MIN_LENGTH)))
+    text = cv2.subtract(ink, lines)
+    words = cv2.dilate(text, cv2.getStructuringElement(cv2.MORPH_RECT, TEXT_DILATION))
+
+    _, _, stats, _ = cv2.connectedComponentsWithStats(words, connectivity=8)
+    boxes = []
+    for x, y, w, h, _ in stats[1:].tolist():  # label 0 is the background
+        if TEXT_MIN_HEIGHT <= min(w, h) <= TEXT_MAX_HEIGHT:
+            boxes.append((x, y, w, h))
+
+    # Rows top to bottom, boxes in a row left to right
+    boxes.sort(key=lambda box: box[1])
+    ordered = []
+    row = []
+    for box in boxes:
+        if row and box[1] - row[0][1] >= ROW_TOLERANCE:
+            ordered.extend(sorted(row))
+            row = []
+        row.append(box)
+    ordered.extend(sorted(row))
+    return ordered
+
+
+def crop_text_boxes(img_array, boxes):
+    """Padded crops of the boxes; vertical text is turned upright as PaddleOCR does."""
+    import numpy as np
+
+    height, width = img_array.shape[:2]
+    crops = []
+    for x, y, w, h in boxes:
+        crop = img_array[max(y - CROP_PADDING, 0):min(y + h + CROP_PADDING, height),
+                         max(x - CROP_PADDING, 0):min(x + w + CROP_PADDING, width)]
+        if h >= 1.5 * w:
+            crop = np.rot90(crop)
+        crops.append(np.ascontiguousarray(crop))
+    return crops
+
+
+def recognize_regions(ocr, images, detect: bool = False) -> List[List[str]]:
+    """
+    Casting lines ("NAME : WxH") for each rendered region; None entries
+    (regions that failed to render) give no lines.
+
+    The text crops of all regions are recognized in one recognition-only call,
+    which the recognizer runs in batches (PaddleOCR's rec_batch_num). Regions
+    that yield no casting lines that way, and all regions when detect is
+    True, go through PaddleOCR's full detection + angle classification.
+    """
+    regions = [[] for _ in images]
+    if not detect:
+        crops = []
+        owners = []
+        for idx, img_array in enumerate(images):
+            if img_array is None:
+                continue
+            region_crops = crop_text_boxes(img_array, find_text_boxes(img_array))
+            crops.extend(region_crops)
+            owners.extend([idx] * len(region_crops))
+        log.info("Recognizing %d text crops from %d regions", len(crops), len(images))
+
+        if crops:
+            tokens = [[] for _ in images]
+            try:
+                results = ocr.ocr(crops, det=False, cls=False)[0] or []
+            except Exception as e:
+                log.warning("Batched text recognition failed: %s", e)
+                results = []
+            for idx, result in zip(owners, results):
+                if result is not None:
+                    tokens[idx].append(tuple(result))
+            regions = [parse_ocr_tokens(region_tokens) for region_tokens in tokens]
+
+    for idx, img_array in enumerate(images):
+        if img_array is None or regions[idx]:
+            continue
+        if not detect:
+            log.info("No casting data in text crops of region %d, running full OCR", idx + 1)
+        try:
+            regions[idx] = parse_ocr_tokens(ocr_tokens(ocr.ocr(img_array, cls=True)))
+        except Exception as e:
+            log.warning("Error processing rectangle %d: %s", idx + 1, e)
+    return regions
+
+
+def parse_ocr_tokens(tokens) -> List[str]:
+    """
+    Pair casting names (SW, LSW, LIFT ...) with the dimension token that
+    follows them. tokens are (text, confidence) pairs in reading order;
+    returns "NAME : WxH" lines.
+    """
+    # Checked once so the per-token logging costs nothing when disabled
+    debug = log.isEnabledFor(logging.DEBUG)
+    pillar_name = ""
+    casting_output = []
+    for text, confidence in tokens:
+        # Skip low confidence results
+        if confidence < MIN_CONFIDENCE:
+            continue
+
+        if debug:
+            log.debug("OCR found: %r (confidence: %.2f)", text, confidence)
+
+        # Look for casting names
+        if any(key in text.upper() for key in ['SW', 'LSW', 'LIFT']):
+            pillar_name = text.strip().replace('\n', '').replace(' ', '')
+            if debug:
+                log.debug("Found pillar name: %s", pillar_name)
+
+        # Look for dimensions (with X or x)
+        elif any(sep in text.upper() for sep in ['X', 'x', '*']) and pillar_name:
+            dimension = text.strip().replace('\n', '').replace(' ', '')
+            casting_output.append(f"{pillar_name} : {dimension}")
+            if debug:
+                log.debug("Found dimension: %s : %s", pillar_name, dimension)
+            pillar_name = ""  # Reset for next pair
+    return casting_output
+
+
+def ocr_tokens(results):
+    """Flatten PaddleOCR results into (text, confidence) pairs, skipping malformed entries."""
+    tokens = []
+    if not results or results[0] is None:
+        return tokens
+    for line in results:
+        if line is None:
+            continue
+        for word_info in line:
+            if word_info is None:
+                continue
+            try:
+                _, (text, confidence) = word_info
+            except Exception as parse_error:
+                log.warning("Error parsing OCR result: %s", parse_error)
+                continue
+            tokens.append((text, confidence))
+    return tokens
+
+
+def format_casting_data(regions: List[List[str]]) -> str:
+    """Format the lines found per region as the "Casting N :" text sent to the LLM."""
+    casting_data = ""
+    for idx, lines in enumerate(regions):
+        if lines:
+            casting_data += f"Casting {idx + 1} :\n"
+            for line in lines:
+                casting_data += f"{line}\n"
+            casting_data += "\n"
+    return casting_data
+
+
+def build_prompt(casting_data: str) -> str:
+    return PROMPT_TEMPLATE.format(casting_data=casting_data)
+
+
+def parse_llm_response(raw_response: str) -> dict:
+    """
+    Parse the LLM's castings JSON, tolerating a surrounding Markdown code fence.
+    Raises json.JSONDecodeError or ValueError.
+    """
+    cleaned_response = re.sub(r"^```(?:json)?\s*|\s*```$", "", raw_response.strip())
+    log.debug("Gemini response: %s", cleaned_response)
+
+    json_data = json.loads(cleaned_response)
+    if not json_data or not isinstance(json_data, dict):
+        raise ValueError("Invalid JSON structure received from Gemini")
+    return json_data
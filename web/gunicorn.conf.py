@@ -0,0 +1,38 @@
+"""
+Gunicorn settings for the production server: gunicorn -c gunicorn.conf.py wsgi:app
+
+    WEB_CONCURRENCY   worker processes (default: 1, see below)
+    WEB_THREADS       threads per worker (default: 2 x CPUs + 1)
+    PORT              listen port (default: 5000)
+    WEB_TIMEOUT       worker timeout in seconds (default: 120, PDF extraction is slow)
+
+Optimized plans live in the memory of the worker that produced them, and
+/optimize/update, /primary-ranking and /cutting-plan look them up by planId.
+Another worker would answer 404 "Unknown or expired plan", so the default is
+a single worker with several threads. Only run more workers behind a load
+balancer that sends all requests of a client to the same worker (sticky
+sessions); /optimize and /extract-pdf alone work with any number.
+"""
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+threads = int(os.getenv("WEB_THREADS", multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gthread"
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+
+# Import wsgi.py (and run its warm-up) once in the master, then fork, so the
+# warmed layout cache is shared copy-on-write between workers (when there are
+# several)
+preload_app = True
+
+
+def post_fork(server, worker):
+    """Per-worker setup for state that does not survive fork()."""
+    from server_logging import setup_logging
+    from wsgi import warm_up_worker
+
+    # The master's log listener thread is not running in the worker
+    setup_logging()
+    warm_up_worker()
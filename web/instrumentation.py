@@ -0,0 +1,171 @@
+"""
+Timing and counter instrumentation for the optimizer and the server.
+
+A process-wide `metrics` registry collects counters, gauges and timing
+summaries and renders them in the Prometheus text format. Timers also append
+to the current request's timing list, when one has been started, so the
+server can report them in a Server-Timing header.
+"""
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# (name, seconds) pairs recorded while handling the current request
+request_timings = contextvars.ContextVar('request_timings', default=None)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"') for _, value in key)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + "}"
+
+
+class Metrics:
+    """Thread-safe registry of counters, gauges and timing summaries."""
+
+    def __init__(self, prefix="constro"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._summaries = {}   # (name, labels) -> [sum, count]
+        self._help = {}
+
+    def describe(self, name, help_text):
+        self._help[name] = help_text
+
+    def increment(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges[(name, _label_key(labels))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, _label_key(labels))
+        with self._lock:
+            summary = self._summaries.setdefault(key, [0.0, 0])
+            summary[0] += value
+            summary[1] += 1
+
+    def record_time(self, name, seconds, **labels):
+        """Observe a duration and add it to the current request's timings."""
+        self.observe(name, seconds, **labels)
+        timings = request_timings.get()
+        if timings is not None:
+            timings.append(("_".join(str(v) for v in labels.values()) or name, seconds))
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_time(name, time.perf_counter() - start, **labels)
+
+    def stages(self, name):
+        """Return a StageTimer recording consecutive stages under one metric."""
+        return StageTimer(self, name)
+
+    def value(self, name, **labels):
+        """Current value of a counter or gauge (0 if never set)."""
+        key = (name, _label_key(labels))
+        with self._lock:
+            return self._counters.get(key, self._gauges.get(key, 0))
+
+    def cache_hit_rate(self):
+        hits = self.value("panel_cache_hits_total")
+        total = hits + self.value("panel_cache_misses_total")
+        return hits / total if total else 0.0
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format."""
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            summaries = {key: list(value) for key, value in self._summaries.items()}
+
+        lines = []
+        for kind, series in (("counter", counters), ("gauge", gauges), ("summary", summaries)):
+            seen = set()
+            for (name, key), value in sorted(series.items(), key=lambda item: item[0]):
+                full_name = f"{self.prefix}_{name}"
+                if name not in seen:
+                    seen.add(name)
+                    if name in self._help:
+                        lines.append(f"# HELP {full_name} {self._help[name]}")
+                    lines.append(f"# TYPE {full_name} {kind}")
+                labels = _format_labels(key)
+                if kind == "summary":
+                    lines.append(f"{full_name}_sum{labels} {value[0]:.6f}")
+                    lines.append(f"{full_name}_count{labels} {value[1]}")
+                else:
+                    lines.append(f"{full_name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """Times consecutive stages of a computation: call mark() at the end of each."""
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.registry.record_time(self.name, now - self.last, stage=stage)
+        self.last = now
+
+
+def start_request_timings():
+    """Begin collecting timings for the current request; returns the list."""
+    timings = []
+    request_timings.set(timings)
+    return timings
+
+
+def server_timing_header(timings):
+    """
+    Format collected (name, seconds) timings as a Server-Timing header value,
+    summing repeated names (e.g. one entry per generated side length).
+    """
+    totals = {}
+    for name, seconds in timings:
+        totals[name] = totals.get(name, 0.0) + seconds
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
+
+
+metrics = Metrics()
+metrics.describe("optimize_stage_seconds", "Time spent in each optimize_panels step")
+metrics.describe("panel_generation_seconds", "Time spent generating layouts for uncached lengths")
+metrics.describe("panel_cache_hits_total", "get_possible_panels calls answered from the cache")
+metrics.describe("panel_cache_misses_total", "get_possible_panels calls that generated layouts")
+metrics.describe("panel_cache_evictions_total", "Layouts dropped from the full layout cache, least recently used first")
+metrics.describe("panel_candidates", "Candidate layouts generated for each uncached side length")
+metrics.describe("extract_stage_seconds", "Time spent in each /extract-pdf stage")
+metrics.describe("http_request_seconds", "Request handling time per endpoint")
+metrics.describe("result_cache_hits_total", "/optimize requests answered from the result cache")
+metrics.describe("result_cache_misses_total", "/optimize requests that ran the optimizer")
+metrics.describe("llm_requests_total", "LLM backend calls by outcome (ok, error)")
+metrics.describe("llm_retries_total", "LLM calls retried after a transient error")
+metrics.describe("llm_coalesced_total", "LLM requests answered by an identical call already in flight")
+metrics.describe("singleflight_leaders_total", "Requests that ran a computation other identical requests could join")
+metrics.describe("singleflight_coalesced_total", "Requests that waited for an identical request's computation")
+metrics.describe("singleflight_timeouts_total", "Coalesced requests that gave up waiting")
+metrics.describe("extract_upload_bytes", "Size of /extract-pdf uploads, by where they were held")
+metrics.describe("extract_buffer_bytes", "Upload and rendered region bytes held per /extract-pdf request")
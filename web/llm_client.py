@@ -0,0 +1,233 @@
+"""
+Shared LLM client for the castings JSON conversion.
+
+One configured client is reused across requests. Each call has a timeout,
+transient failures are retried a bounded number of times with exponential
+backoff, and a semaphore caps concurrent calls. Identical prompts that are
+already in flight are coalesced: later callers wait for the first call and
+share its result.
+
+The backend is pluggable. "gemini" calls Gemini; "stub" converts the casting
+lines locally and deterministically, so load tests and CI can run the full
+PDF path offline. Configured from the environment by get_llm_client():
+
+    LLM_BACKEND       gemini (default) or stub
+    LLM_MODEL         Gemini model name (default: gemini-2.0-flash)
+    LLM_TIMEOUT       seconds per attempt (default: 60)
+    LLM_RETRIES       retries after the first attempt (default: 2)
+    LLM_CONCURRENCY   concurrent calls per process (default: 8)
+    LLM_STUB_LATENCY  simulated stub latency in seconds (default: 0)
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+try:
+    from .instrumentation import metrics
+except ImportError:
+    from instrumentation import metrics
+
+log = logging.getLogger("server")
+
+# Exception class names treated as transient, whichever client library raised them
+TRANSIENT_ERRORS = {
+    "TimeoutError", "ConnectionError", "DeadlineExceeded", "ServiceUnavailable",
+    "ResourceExhausted", "InternalServerError", "TooManyRequests", "RetryError",
+}
+
+
+def is_transient(error: BaseException) -> bool:
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+class GeminiBackend:
+    """Gemini through google-generativeai, configured once."""
+
+    def __init__(self, api_key: str, model_name: str = "gemini-2.0-flash"):
+        from google import generativeai as genai
+
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt: str, timeout: float) -> str:
+        return self.model.generate_content(prompt, request_options={"timeout": timeout}).text
+
+    async def generate_async(self, prompt: str, timeout: float) -> str:
+        response = await self.model.generate_content_async(prompt, request_options={"timeout": timeout})
+        return response.text
+
+
+class StubBackend:
+    """
+    Offline stand-in: converts the "Casting N :" / "NAME : WxH" lines of the
+    prompt into the JSON the real model is asked for.
+    """
+
+    CASTING_LINE = re.compile(r"^\s*Casting\s+(\d+)\s*:\s*$")
+    SHAPE_LINE = re.compile(r"^\s*(\S+)\s*:\s*(\d+)\s*[xX*]\s*(\d+)")
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    def convert(self, prompt: str) -> str:
+        # Only the data after the instructions is converted
+        data = prompt.rsplit("Now convert the following data into JSON:", 1)[-1]
+        castings = {}
+        current = None
+        for line in data.splitlines():
+            casting_match = self.CASTING_LINE.match(line)
+            shape_match = self.SHAPE_LINE.match(line)
+            if casting_match:
+                current = castings.setdefault(f"casting_{len(castings) + 1}", {})
+            elif shape_match and current is not None:
+                name, width, height = shape_match.groups()
+                current[name] = {"side_1": int(width), "side_2": int(height)}
+        return json.dumps(castings)
+
+    def generate(self, prompt: str, timeout: float) -> str:
+        if self.latency:
+            time.sleep(min(self.latency, timeout))
+        return self.convert(prompt)
+
+    async def generate_async(self, prompt: str, timeout: float) -> str:
+        if self.latency:
+            await asyncio.sleep(min(self.latency, timeout))
+        return self.convert(prompt)
+
+
+class LLMClient:
+    def __init__(self, backend, timeout: float = 60.0, retries: int = 2,
+                 backoff: float = 0.5, max_concurrency: int = 8):
+        self.backend = backend
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_concurrency = max_concurrency
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._inflight = {}         # prompt hash -> concurrent.futures.Future
+        self._async_semaphore = None
+        self._async_inflight = {}   # prompt hash -> asyncio.Future
+
+    def _delay(self, attempt: int) -> float:
+        # Exponential backoff with jitter so retries from many requests spread out
+        return self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+
+    def generate(self, prompt: str) -> str:
+        """Return the model's reply, sharing the call with identical prompts in flight."""
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        with self._lock:
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+        if not leader:
+            metrics.increment("llm_coalesced_total")
+            return future.result()
+
+        try:
+            result = self._call(prompt)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def _call(self, prompt: str) -> str:
+        for attempt in range(self.retries + 1):
+            with self._semaphore:
+                start = time.perf_counter()
+                try:
+                    result = self.backend.generate(prompt, self.timeout)
+                    metrics.increment("llm_requests_total", outcome="ok")
+                    return result
+                except Exception as e:
+                    metrics.increment("llm_requests_total", outcome="error")
+                    if not is_transient(e) or attempt == self.retries:
+                        raise
+                    log.warning("LLM call failed (%s), retrying (%d/%d)", e, attempt + 1, self.retries)
+                finally:
+                    metrics.record_time("extract_stage_seconds", time.perf_counter() - start, stage="llm")
+            metrics.increment("llm_retries_total")
+            time.sleep(self._delay(attempt))
+
+    async def generate_async(self, prompt: str) -> str:
+        """Async generate() for the ASGI server; coalesces within the event loop."""
+        key = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        future = self._async_inflight.get(key)
+        if future is not None:
+            metrics.increment("llm_coalesced_total")
+            return await asyncio.shield(future)
+
+        future = self._async_inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await self._call_async(prompt)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when no other caller was waiting
+            future.exception()
+            raise
+        finally:
+            del self._async_inflight[key]
+
+    async def _call_async(self, prompt: str) -> str:
+        if self._async_semaphore is None:
+            self._async_semaphore = asyncio.Semaphore(self.max_concurrency)
+        for attempt in range(self.retries + 1):
+            async with self._async_semaphore:
+                start = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(self.backend.generate_async(prompt, self.timeout),
+                                                    timeout=self.timeout)
+                    metrics.increment("llm_requests_total", outcome="ok")
+                    return result
+                except Exception as e:
+                    metrics.increment("llm_requests_total", outcome="error")
+                    if not is_transient(e) or attempt == self.retries:
+                        raise
+                    log.warning("LLM call failed (%s), retrying (%d/%d)", e, attempt + 1, self.retries)
+                finally:
+                    metrics.record_time("extract_stage_seconds", time.perf_counter() - start, stage="llm")
+            metrics.increment("llm_retries_total")
+            await asyncio.sleep(self._delay(attempt))
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_llm_client():
+    """
+    The process-wide client configured from the environment, or None when
+    the Gemini backend is selected but GEMINI_API_KEY is not set.
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            backend_name = os.getenv("LLM_BACKEND", "gemini")
+            if backend_name == "stub":
+                backend = StubBackend(float(os.getenv("LLM_STUB_LATENCY", "0")))
+            elif backend_name == "gemini":
+                api_key = os.getenv("GEMINI_API_KEY")
+                if not api_key:
+                    return None
+                backend = GeminiBackend(api_key, os.getenv("LLM_MODEL", "gemini-2.0-flash"))
+            else:
+                raise ValueError(f"Unknown LLM_BACKEND: {backend_name}")
+            _client = LLMClient(backend,
+                                timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+                                retries=int(os.getenv("LLM_RETRIES", "2")),
+                                max_concurrency=int(os.getenv("LLM_CONCURRENCY", "8")))
+        return _client
@@ -0,0 +1,146 @@
+"""
+Side-effect-free optimization API.
+
+optimize(project, config) never touches the caller's objects: a Project is an
+immutable snapshot of the input, and the returned Plan is an immutable
+description of the chosen layouts and statistics. The only shared state is
+the layout cache of get_possible_panels, which is safe to use from several
+threads, so one process can run many optimizations at once and reuse a
+parsed Project across scenarios (different primaries, catalogs, stock modes).
+
+The layouts are chosen by optimize_panels() itself, run on private Casting
+objects, so a Plan always matches what create_plan() would produce.
+
+Use Plan.to_castings() to get regular Casting objects with the layouts
+applied, e.g. for print_results() or the JSON/project-file writers.
+"""
+from types import MappingProxyType
+from typing import Dict, List, Mapping, NamedTuple, Tuple
+
+try:
+    from .demo_last_saved import (
+        Casting, Shape, PanelCatalog, DEFAULT_CATALOG, compute_panel_statistics, optimize_panels
+    )
+except ImportError:
+    from demo_last_saved import (
+        Casting, Shape, PanelCatalog, DEFAULT_CATALOG, compute_panel_statistics, optimize_panels
+    )
+
+class Project(NamedTuple):
+    """
+    Immutable input: unique shapes as (name, sides) pairs and, per casting,
+    the indices of its shapes. Identical shapes are stored once.
+    """
+    casting_names: Tuple[str, ...]
+    casting_shapes: Tuple[Tuple[int, ...], ...]
+    shapes: Tuple[Tuple[str, Tuple[int, ...]], ...]
+
+    @classmethod
+    def from_castings(cls, castings: List[Casting]) -> "Project":
+        return cls.from_dicts(
+            {"name": casting.name,
+             "shapes": [{"name": shape.name, "sides": shape.sides} for shape in casting.shapes]}
+            for casting in castings
+        )
+
+    @classmethod
+    def from_dicts(cls, castings_data) -> "Project":
+        """Build from the /optimize request format ({"name", "shapes": [{"name", "sides"}]})."""
+        shape_index = {}
+        names = []
+        casting_shapes = []
+        for casting_data in castings_data:
+            refs = []
+            for shape_data in casting_data["shapes"]:
+                key = (shape_data["name"], tuple(int(length) for length in shape_data["sides"]))
+                refs.append(shape_index.setdefault(key, len(shape_index)))
+            names.append(casting_data["name"])
+            casting_shapes.append(tuple(refs))
+        if len(set(names)) != len(names):
+            duplicates = sorted({name for name in names if names.count(name) > 1})
+            raise ValueError(f"Duplicate casting names: {', '.join(duplicates)}")
+        return cls(tuple(names), tuple(casting_shapes), tuple(shape_index))
+
+    def index(self, casting_name: str) -> int:
+        try:
+            return self.casting_names.index(casting_name)
+        except ValueError:
+            raise KeyError(f"Unknown casting: {casting_name}") from None
+
+
+class OptimizeConfig(NamedTuple):
+    """Scenario settings: the primary casting, the panel catalog and the stock mode."""
+    primary: str
+    catalog: PanelCatalog = None
+    use_stock: bool = False
+
+
+class Plan(NamedTuple):
+    """
+    Result of optimize(): for every unique shape of the project, one layout
+    tuple per side, plus the reuse statistics. stats is frozen (read-only
+    mappings and tuples); stats_dict() returns a plain copy, e.g. for JSON.
+    """
+    project: Project
+    config: OptimizeConfig
+    shape_layouts: Tuple[Tuple[Tuple[int, ...], ...], ...]
+    stats: Mapping
+
+    def stats_dict(self) -> Dict:
+        """A mutable copy of stats, in the format of compute_panel_statistics()."""
+        return _thaw(self.stats)
+
+    def to_castings(self) -> List[Casting]:
+        """Fresh Casting objects with the plan's layouts applied; shared shapes stay shared."""
+        castings, _ = _build_castings(self.project, self.shape_layouts)
+        return castings
+
+
+def optimize(project: Project, config: OptimizeConfig) -> Plan:
+    """
+    Run optimize_panels() on a private copy of the project and compute the
+    reuse statistics for config.primary, without mutating any input.
+    """
+    catalog = config.catalog or DEFAULT_CATALOG
+    primary_idx = project.index(config.primary)
+
+    castings, shapes = _build_castings(project)
+    optimize_panels(castings, primary_idx, catalog, config.use_stock)
+    shape_layouts = tuple(tuple(tuple(layout) for layout in shape.panel_layout) for shape in shapes)
+
+    stats = compute_panel_statistics(castings, primary_idx, catalog)
+    return Plan(project, config, shape_layouts, _freeze(stats))
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, Mapping):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+def _build_castings(project: Project, shape_layouts=None) -> Tuple[List[Casting], List[Shape]]:
+    """Casting objects for the project, one Shape per unique shape, with shape_layouts applied if given."""
+    shapes = []
+    for idx, (name, sides) in enumerate(project.shapes):
+        shape = Shape(name, list(sides))
+        if shape_layouts is not None:
+            shape.panel_layout = [list(layout) for layout in shape_layouts[idx]]
+        shapes.append(shape)
+
+    castings = []
+    for name, refs in zip(project.casting_names, project.casting_shapes):
+        casting = Casting(name)
+        for idx in refs:
+            casting.add_shape(shapes[idx])
+        castings.append(casting)
+    return castings, shapes
@@ -0,0 +1,263 @@
+"""
+Compact binary project files (.cproj) holding castings, shapes, side lengths,
+the chosen panel layouts and the reuse statistics.
+
+Layout (all integers little-endian):
+
+    b"CPRJ"  uint16 version  uint32 header_size  header (UTF-8 JSON)
+    padding to a 4-byte boundary, then int32 arrays back to back:
+      casting_shapes   shape index per casting slot      (sliced by casting_offsets)
+      casting_offsets  n_castings + 1 offsets into casting_shapes
+      shape_sides      n_shapes + 1 offsets into side_lengths / side_layouts
+      side_lengths     length of every side of every unique shape
+      side_layouts     layout index per side (-1 when not optimized)
+      layout_offsets   n_layouts + 1 offsets into layout_panels
+      layout_panels    panel sizes of every distinct layout
+
+The header holds names, the primary casting, statistics, an input
+fingerprint and the array lengths. Shapes shared between castings (see
+dedupe_shapes) and identical layouts are stored once. Files are read through
+mmap, so the arrays are viewed in place rather than parsed.
+"""
+import hashlib
+import json
+import mmap
+import struct
+import sys
+from array import array
+from typing import Dict, List
+
+try:
+    from .demo_last_saved import Casting, Shape, PanelCatalog, DEFAULT_CATALOG, create_plan
+except ImportError:
+    from demo_last_saved import Casting, Shape, PanelCatalog, DEFAULT_CATALOG, create_plan
+
+MAGIC = b"CPRJ"
+VERSION = 1
+ARRAY_NAMES = ("casting_shapes", "casting_offsets", "shape_sides", "side_lengths",
+               "side_layouts", "layout_offsets", "layout_panels")
+_PREAMBLE = struct.Struct("<4sHI")
+
+
+class ProjectFormatError(ValueError):
+    """The data is not a readable project file: wrong magic or version, truncated or corrupt."""
+
+
+def input_fingerprint(castings: List[Casting], primary_name: str, catalog: PanelCatalog = None,
+                      options: Dict = None) -> str:
+    """
+    Hash of everything the optimization result depends on: castings, shapes,
+    side lengths, the primary casting, the panel catalog and any further
+    options that change the result (such as the stock mode).
+    """
+    canonical = {
+        "castings": [[c.name, [[s.name, list(s.sides)] for s in c.shapes]] for c in castings],
+        "primary": primary_name,
+        "panels": (catalog or DEFAULT_CATALOG).to_dict()
+    }
+    if options:
+        canonical["options"] = options
+    encoded = json.dumps(canonical, separators=(",", ":"), sort_keys=True).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _int32_array(values=()) -> array:
+    arr = array("i", values)
+    if arr.itemsize != 4:
+        raise RuntimeError("Project files require a 4-byte C int")
+    return arr
+
+
+def save_project(path: str, castings: List[Casting], primary_idx: int, stats: Dict = None,
+                 catalog: PanelCatalog = None) -> None:
+    """
+    Write castings, their current panel layouts (produced with catalog) and
+    optional statistics to path.
+    """
+    with open(path, "wb") as f:
+        write_project(f, castings, primary_idx, stats, catalog)
+
+
+def write_project(f, castings: List[Casting], primary_idx: int, stats: Dict = None,
+                  catalog: PanelCatalog = None) -> None:
+    """Write a project to a binary file object."""
+    catalog = catalog or DEFAULT_CATALOG
+    arrays = {name: _int32_array() for name in ARRAY_NAMES}
+    shape_names = []
+    shape_index = {}
+    layout_index = {}
+    arrays["casting_offsets"].append(0)
+    arrays["shape_sides"].append(0)
+    arrays["layout_offsets"].append(0)
+
+    for casting in castings:
+        for shape in casting.shapes:
+            idx = shape_index.get(id(shape))
+            if idx is None:
+                idx = shape_index[id(shape)] = len(shape_names)
+                shape_names.append(shape.name)
+                arrays["side_lengths"].extend(shape.sides)
+                for side_idx in range(len(shape.sides)):
+                    panels = shape.panel_layout[side_idx] if side_idx < len(shape.panel_layout) else []
+                    if not panels:
+                        arrays["side_layouts"].append(-1)
+                        continue
+                    key = tuple(panels)
+                    if key not in layout_index:
+                        layout_index[key] = len(layout_index)
+                        arrays["layout_panels"].extend(panels)
+                        arrays["layout_offsets"].append(len(arrays["layout_panels"]))
+                    arrays["side_layouts"].append(layout_index[key])
+                arrays["shape_sides"].append(len(arrays["side_lengths"]))
+            arrays["casting_shapes"].append(idx)
+        arrays["casting_offsets"].append(len(arrays["casting_shapes"]))
+
+    primary_name = castings[primary_idx].name
+    header = {
+        "castings": [casting.name for casting in castings],
+        "shapes": shape_names,
+        "primary": primary_name,
+        "catalog": catalog.to_dict(),
+        "fingerprint": input_fingerprint(castings, primary_name, catalog),
+        "stats": stats,
+        "arrays": {name: len(arrays[name]) for name in ARRAY_NAMES}
+    }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    padding = -(_PREAMBLE.size + len(header_bytes)) % 4
+
+    f.write(_PREAMBLE.pack(MAGIC, VERSION, len(header_bytes)))
+    f.write(header_bytes)
+    f.write(b"\0" * padding)
+    for name in ARRAY_NAMES:
+        arr = arrays[name]
+        if sys.byteorder == "big":
+            arr = array("i", arr)
+            arr.byteswap()
+        f.write(arr.tobytes())
+
+
+def _read_arrays(buffer, header):
+    """View the int32 arrays of a mapped project file without copying."""
+    offset = _PREAMBLE.size + header["header_size"]
+    offset += -offset % 4
+    view = memoryview(buffer)
+    arrays = {}
+    for name in ARRAY_NAMES:
+        count = header["arrays"][name]
+        if count < 0 or offset + 4 * count > len(view):
+            raise ProjectFormatError("Truncated project file")
+        raw = view[offset:offset + 4 * count]
+        if sys.byteorder == "big":
+            swapped = array("i", raw.tobytes())
+            swapped.byteswap()
+            arrays[name] = swapped
+        else:
+            arrays[name] = raw.cast("i")
+        offset += 4 * count
+    return arrays
+
+
+def load_project(path: str, catalog: PanelCatalog = None) -> Dict:
+    """
+    Load a project file for use with catalog (default: the catalog it was
+    saved with). Returns a dict with "castings" (with layouts restored),
+    "primary_idx", "catalog", "stats" and "optimized", which is False when the
+    stored layouts cannot be reused (missing, or produced for a different panel
+    catalog) and the caller should re-optimize.
+    """
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return read_project(mapped, catalog)
+
+
+def read_project(buffer, catalog: PanelCatalog = None) -> Dict:
+    """
+    Load a project from a bytes-like object; see load_project(). Raises
+    ProjectFormatError if the data is not a complete project file.
+    """
+    try:
+        return _read_project(buffer, catalog)
+    except (struct.error, IndexError, KeyError, TypeError) as e:
+        raise ProjectFormatError(f"Truncated or corrupt project file ({type(e).__name__}: {e})") from e
+
+
+def _read_project(buffer, catalog: PanelCatalog = None) -> Dict:
+    magic, version, header_size = _PREAMBLE.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ProjectFormatError("Not a project file")
+    if version != VERSION:
+        raise ProjectFormatError(f"Unsupported project file version {version}")
+    if _PREAMBLE.size + header_size > len(buffer):
+        raise ProjectFormatError("Truncated project file")
+    try:
+        header = json.loads(bytes(buffer[_PREAMBLE.size:_PREAMBLE.size + header_size]))
+    except ValueError as e:
+        raise ProjectFormatError(f"Corrupt project file header ({e})") from e
+    header["header_size"] = header_size
+    arrays = _read_arrays(buffer, header)
+    try:
+        castings, complete = _build_castings(header, arrays)
+    finally:
+        # Release the views so a memory map can be closed by the caller
+        for view in arrays.values():
+            if isinstance(view, memoryview):
+                view.release()
+
+    if catalog is None:
+        catalog = PanelCatalog.from_dict(header["catalog"]) if "catalog" in header else DEFAULT_CATALOG
+    primary_idx = header["castings"].index(header["primary"])
+    optimized = (complete and header.get("stats") is not None and
+                 header["fingerprint"] == input_fingerprint(castings, header["primary"], catalog))
+    return {
+        "castings": castings,
+        "primary_idx": primary_idx,
+        "catalog": catalog,
+        "stats": header.get("stats"),
+        "optimized": optimized
+    }
+
+
+def _build_castings(header, arrays):
+    """Castings with their stored layouts; complete is False if any side has none."""
+    layouts = []
+    offsets = arrays["layout_offsets"]
+    panels = arrays["layout_panels"]
+    for i in range(len(offsets) - 1):
+        layouts.append(panels[offsets[i]:offsets[i + 1]].tolist())
+
+    shapes = []
+    shape_sides = arrays["shape_sides"]
+    lengths = arrays["side_lengths"]
+    side_layouts = arrays["side_layouts"]
+    complete = True
+    for i, name in enumerate(header["shapes"]):
+        start, end = shape_sides[i], shape_sides[i + 1]
+        shape = Shape(name, lengths[start:end].tolist())
+        for side_idx, layout_idx in enumerate(side_layouts[start:end].tolist()):
+            if layout_idx < 0:
+                complete = False
+            else:
+                shape.panel_layout[side_idx] = list(layouts[layout_idx])
+        shapes.append(shape)
+
+    castings = []
+    casting_offsets = arrays["casting_offsets"]
+    casting_shapes = arrays["casting_shapes"]
+    for i, name in enumerate(header["castings"]):
+        casting = Casting(name)
+        for shape_idx in casting_shapes[casting_offsets[i]:casting_offsets[i + 1]].tolist():
+            casting.add_shape(shapes[shape_idx])
+        castings.append(casting)
+    return castings, complete
+
+
+def ensure_optimized(project: Dict) -> Dict:
+    """
+    Re-optimize a loaded project only if its stored layouts cannot be reused.
+    Returns the project dict with "stats" filled in.
+    """
+    if not project["optimized"]:
+        plan = create_plan(project["castings"], project["primary_idx"], project["catalog"])
+        project["stats"] = plan["stats"]
+        project["optimized"] = True
+    return project
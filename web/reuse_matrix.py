@@ -0,0 +1,116 @@
+"""
+Reuse statistics for every choice of primary casting at once.
+
+The layouts chosen by optimize_panels do not depend on the primary casting;
+only the reuse analysis does. So after one optimization the per-casting panel
+counts are put into a castings x sizes matrix, and the new panels needed and
+the reuse efficiency for every possible primary follow from a few array
+operations instead of one /optimize run per candidate.
+"""
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+try:
+    from .demo_last_saved import Casting, PanelCatalog, DEFAULT_CATALOG, count_casting_panels
+except ImportError:
+    from demo_last_saved import Casting, PanelCatalog, DEFAULT_CATALOG, count_casting_panels
+
+# Rows of the pairwise comparison processed per step, bounding the
+# (rows x castings x sizes) temporary
+PAIRWISE_BLOCK_ROWS = 64
+
+
+def panel_count_matrix(castings: List[Casting]) -> Tuple[np.ndarray, List[int]]:
+    """
+    Count matrix of the castings' current layouts: entry [i, j] is how many
+    panels of sizes[j] casting i uses. Returns (matrix, sizes).
+    """
+    shape_cache = {}
+    per_casting = [count_casting_panels(casting, shape_cache) for casting in castings]
+    sizes = sorted({size for counts in per_casting for size in counts})
+    column = {size: j for j, size in enumerate(sizes)}
+
+    matrix = np.zeros((len(castings), len(sizes)), dtype=np.int64)
+    for i, counts in enumerate(per_casting):
+        for size, count in counts.items():
+            matrix[i, column[size]] = count
+    return matrix, sizes
+
+
+def primary_reuse(matrix: np.ndarray, sizes: List[int], catalog: PanelCatalog = None) -> Dict[str, np.ndarray]:
+    """
+    Reuse statistics for every row of matrix taken as the primary, with the
+    same model as summarize_panel_usage: secondaries need new panels of a size
+    beyond what the primary has of it.
+    """
+    catalog = catalog or DEFAULT_CATALOG
+    standard = np.array([catalog.is_standard(size) for size in sizes], dtype=bool)
+
+    secondary = matrix.sum(axis=0)[None, :] - matrix
+    new = np.maximum(secondary - matrix, 0)
+    total_secondary = secondary.sum(axis=1)
+    new_total = new.sum(axis=1)
+    reused = total_secondary - new_total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        efficiency = np.where(total_secondary > 0, reused / total_secondary * 100, 0.0)
+
+    return {
+        "standard_new": new[:, standard].sum(axis=1),
+        "custom_new": new[:, ~standard].sum(axis=1),
+        "total_new": new_total,
+        "reused_panels": reused,
+        "total_panels": total_secondary,
+        "efficiency": np.round(efficiency, 1)
+    }
+
+
+def pairwise_reuse(matrix: np.ndarray) -> np.ndarray:
+    """
+    Entry [a, b] is the share of casting b's panels that casting a's panels
+    cover (sum over sizes of min(count_a, count_b) / panels of b), in percent.
+    """
+    n = matrix.shape[0]
+    shared = np.empty((n, n), dtype=np.int64)
+    for start in range(0, n, PAIRWISE_BLOCK_ROWS):
+        block = matrix[start:start + PAIRWISE_BLOCK_ROWS]
+        shared[start:start + len(block)] = np.minimum(block[:, None, :], matrix[None, :, :]).sum(axis=2)
+    totals = matrix.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(totals[None, :] > 0, shared / totals[None, :] * 100, 0.0)
+
+
+def rank_primaries(castings: List[Casting], catalog: PanelCatalog = None, pairwise: bool = False) -> Dict:
+    """
+    Rank every casting as a candidate primary by the new panels the other
+    castings would need (fewest first, then highest reuse efficiency).
+    The castings must already have their layouts applied.
+    With pairwise, also return the casting-to-casting reuse matrix.
+    """
+    matrix, sizes = panel_count_matrix(castings)
+    stats = primary_reuse(matrix, sizes, catalog)
+    order = np.lexsort((-stats["efficiency"], stats["total_new"]))
+
+    ranking = []
+    for i in order.tolist():
+        ranking.append({
+            "casting": castings[i].name,
+            "new_panels": {
+                "standard_new": int(stats["standard_new"][i]),
+                "custom_new": int(stats["custom_new"][i]),
+                "total_new": int(stats["total_new"][i])
+            },
+            "efficiency": {
+                "percentage": float(stats["efficiency"][i]),
+                "reused_panels": int(stats["reused_panels"][i]),
+                "total_panels": int(stats["total_panels"][i])
+            }
+        })
+
+    result = {"sizes": sizes, "ranking": ranking}
+    if pairwise:
+        result["pairwise"] = {
+            "castings": [casting.name for casting in castings],
+            "reuse_percentage": np.round(pairwise_reuse(matrix), 1).tolist()
+        }
+    return result
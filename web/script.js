@@ -3,6 +3,7 @@ document.addEventListener('DOMContentLoaded', function() {
     let castings = [];
     let optimizationResults = null; // Store optimization results for export
     let optimizationComplete = false;
+    let optimizationETag = null; // ETag of optimizationResults, sent back as If-None-Match
     let projectHeight = 2400; // Default height in mm
     
     // DOM Elements
@@ -196,18 +197,29 @@ document.addEventListener('DOMContentLoaded', function() {
         }
 
         try {
+            const headers = {
+                'Content-Type': 'application/json',
+                'Accept': 'application/vnd.constro.compact+json, application/json;q=0.9'
+            };
+            if (optimizationETag && optimizationResults) {
+                headers['If-None-Match'] = optimizationETag;
+            }
+
             const response = await fetch('/optimize', {
                 method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
+                headers: headers,
                 body: JSON.stringify({
                     castings: castings,
                     primaryCasting: primaryCasting
                 })
             });
 
-            const results = await response.json();
+            // 304: the inputs are unchanged and the last results still apply
+            let results = optimizationResults;
+            if (response.status !== 304) {
+                results = expandCompactResults(await response.json());
+                optimizationETag = response.headers.get('ETag');
+            }
             optimizationResults = results; // Store results for export
             optimizationComplete = true;
             displayResults(results);
@@ -385,6 +397,36 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
+    // Expand the compact /optimize format (shared layout dictionary and
+    // columnar shape/casting tables) into the regular nested structure
+    function expandCompactResults(response) {
+        if (!response || response.format !== 'compact') {
+            return response;
+        }
+
+        const compact = response.results;
+        const shapes = compact.shapes.names.map((name, shapeIdx) => ({
+            name: name,
+            sides: compact.shapes.lengths[shapeIdx].map((length, sideIdx) => ({
+                number: sideIdx + 1,
+                length: length,
+                panels: compact.layouts[compact.shapes.layouts[shapeIdx][sideIdx]]
+            }))
+        }));
+
+        const expanded = Object.assign({}, compact, {
+            castings: compact.castings.names.map((name, castingIdx) => ({
+                name: name,
+                type: compact.castings.types[castingIdx],
+                shapes: compact.castings.shapes[castingIdx].map(shapeIdx => shapes[shapeIdx])
+            }))
+        });
+        delete expanded.layouts;
+        delete expanded.shapes;
+
+        return Object.assign({}, response, { results: expanded });
+    }
+
     function displayResults(response) {
         const container = document.getElementById('optimization-results');
         container.innerHTML = '';
@@ -0,0 +1,92 @@
+"""
+JSON serialization for server responses.
+
+Uses orjson when it is installed and falls back to the standard library json
+module otherwise. Optimization results are encoded straight from the Casting
+and Shape objects into JSON fragments, so large responses are not first copied
+into nested dicts; the same fragment encoder backs both whole-body and
+streamed responses.
+"""
+import json
+
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+
+def dumps(obj) -> bytes:
+    """Serialize obj to compact UTF-8 JSON bytes."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def loads(data):
+    """Parse JSON from bytes or str."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(JSONProvider):
+    """Flask JSON provider backed by dumps()/loads(), so jsonify() uses orjson too."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype='application/json')
+
+
+def encode_shape(shape) -> bytes:
+    """Encode one shape with its per-side panel layouts."""
+    sides = b','.join(
+        b'{"number":%d,"length":%s,"panels":%s}' % (side_idx + 1, dumps(length), dumps(panels))
+        for side_idx, (length, panels) in enumerate(zip(shape.sides, shape.panel_layout))
+    )
+    return b'{"name":' + dumps(shape.name) + b',"sides":[' + sides + b']}'
+
+
+def encode_casting(casting, is_primary, shape_cache=None) -> bytes:
+    """
+    Encode a casting as JSON. Shapes shared between castings are encoded once
+    per shape_cache and the cached bytes reused.
+    """
+    if shape_cache is None:
+        shape_cache = {}
+    fragments = []
+    for shape in casting.shapes:
+        fragment = shape_cache.get(id(shape))
+        if fragment is None:
+            fragment = shape_cache[id(shape)] = encode_shape(shape)
+        fragments.append(fragment)
+
+    casting_type = b'"PRIMARY"' if is_primary else b'"SECONDARY"'
+    return (b'{"name":' + dumps(casting.name) + b',"type":' + casting_type +
+            b',"shapes":[' + b','.join(fragments) + b']}')
+
+
+def iter_results_json(payload, castings, primary_name):
+    """
+    Yield payload as JSON in chunks, with payload["results"]["castings"]
+    encoded directly from the given Casting objects, one chunk per casting.
+    """
+    head = {key: value for key, value in payload.items() if key != "results"}
+    yield dumps(head)[:-1] + (b',' if head else b'') + b'"results":{'
+
+    for key, value in payload.get("results", {}).items():
+        yield dumps(key) + b':' + dumps(value) + b','
+
+    yield b'"castings":['
+    shape_cache = {}
+    for i, casting in enumerate(castings):
+        yield (b',' if i else b'') + encode_casting(casting, casting.name == primary_name, shape_cache)
+    yield b']}}'
@@ -5,41 +5,96 @@ import sys
 parent_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.append(parent_dir)
 
-from flask import Flask, request, jsonify, send_from_directory
-from demo_last_saved import Casting, Shape, optimize_panels, print_results
-import io
-import re
+from flask import Flask, Response, g, request, jsonify, send_file, send_from_directory, stream_with_context
+from werkzeug.exceptions import RequestEntityTooLarge
+from demo_last_saved import (
+    Casting, Shape, PanelCatalog, create_plan, update_plan, dedupe_shapes, consolidate_custom_panels
+)
+from serialization import FastJSONProvider, iter_results_json
+from cutting_stock import DEFAULT_STOCK_LENGTH, custom_panel_demand, plan_cuts
+from extract_config import (
+    MAX_REQUEST_BYTES, MAX_UPLOAD_BYTES, OCR_FULL_DETECTION, PADDLE_OCR_AVAILABLE, UPLOAD_SPOOL_BYTES
+)
+from extraction import (
+    build_prompt, find_casting_rectangles, format_casting_data, get_ocr, ocr_lock, parse_llm_response,
+    recognize_regions, render_region
+)
+from planner import OptimizeConfig, Project, optimize as optimize_project
+from project_file import ensure_optimized, input_fingerprint, read_project, write_project
+from server_logging import request_id_var, setup_logging
+from instrumentation import metrics, server_timing_header, start_request_timings
+from llm_client import get_llm_client
+from single_flight import SingleFlight
+from uploads import SpooledUpload, UploadTooLarge
+import time
+import logging
 import json
-import tempfile
-import fitz  # PyMuPDF
-import cv2
-import numpy as np
-from google import generativeai as genai
-from dotenv import load_dotenv
+import threading
+import uuid
+import gzip
+from collections import OrderedDict
 from io import BytesIO
-from paddleocr import PaddleOCR
 
-# Import PaddleOCR and PIL with proper error handling
+setup_logging()
+log = logging.getLogger("server")
+
+# The PDF/OCR/LLM stack (PyMuPDF, OpenCV, NumPy, PaddleOCR, PIL, Gemini) is slow
+# to import, so it is only checked for (extract_config.py) and imported inside
+# the endpoints that need it. An optimize-only service never loads it.
+if not PADDLE_OCR_AVAILABLE:
+    log.warning("PaddleOCR/PIL not found. Please install with: pip install paddleocr pillow")
+
+# Brotli is optional; compact responses fall back to gzip without it
 try:
-    from paddleocr import PaddleOCR
-    from PIL import Image
-    PADDLE_OCR_AVAILABLE = True
-    print("✓ PaddleOCR and PIL successfully imported")
-except ImportError as e:
-    PADDLE_OCR_AVAILABLE = False
-    print(f"✗ PaddleOCR/PIL import failed: {e}")
-    print("Please install with: pip install paddleocr pillow")
-
-# Load environment variables from .env file
-load_dotenv(os.path.join(os.path.dirname(parent_dir), '.env'))
-
-STANDARD_PANEL_SIZES = [100, 200, 300, 400, 500, 600]
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# Environment variables from the .env file are loaded by extract_config
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
-if not GEMINI_API_KEY:
-    print("Warning: GEMINI_API_KEY not found in environment variables")
+if not GEMINI_API_KEY and os.getenv("LLM_BACKEND", "gemini") == "gemini":
+    log.warning("GEMINI_API_KEY not found in environment variables")
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
+
+# Set SERVER_TIMING=1 to report per-stage timings in a Server-Timing header
+app.config['SERVER_TIMING'] = os.getenv('SERVER_TIMING', '0') == '1'
+
+# Set once the process is warmed up (see wsgi.py); /ready reports it
+app.config['READY'] = False
+
+@app.before_request
+def assign_request_id():
+    request_id_var.set(request.headers.get('X-Request-ID') or uuid.uuid4().hex[:12])
+    g.request_start = time.perf_counter()
+    g.timings = start_request_timings()
+
+@app.after_request
+def add_request_id_header(response):
+    response.headers['X-Request-ID'] = request_id_var.get()
+
+    if request.endpoint not in (None, 'serve_index', 'serve_static', 'prometheus_metrics', 'readiness'):
+        elapsed = time.perf_counter() - g.request_start
+        metrics.observe("http_request_seconds", elapsed, endpoint=request.endpoint)
+        if app.config['SERVER_TIMING']:
+            g.timings.append(("total", elapsed))
+            response.headers['Server-Timing'] = server_timing_header(g.timings)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Expose collected metrics in the Prometheus text format."""
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/ready', methods=['GET'])
+def readiness():
+    """Readiness probe: 503 until warm-up has completed."""
+    if not app.config['READY']:
+        return jsonify({'status': 'warming up'}), 503
+    return jsonify({'status': 'ready'})
 
 # Serve static files
 @app.route('/')
@@ -50,12 +105,198 @@ def serve_index():
 def serve_static(path):
     return send_from_directory('.', path)
 
+OPTIMIZE_STEPS = [
+    "Optimizing panel layouts...",
+    "Step 1/4: Collecting all side lengths across castings",
+    "Step 2/4: Creating a panel plan that ensures 100% reuse",
+    "Step 3/4: Selecting optimal panel combinations",
+    "Step 4/4: Applying panel layouts to all castings"
+]
+
+COMPACT_MIMETYPE = 'application/vnd.constro.compact+json'
+MIN_COMPRESS_SIZE = 1024  # bytes; smaller bodies are sent uncompressed
+
+# Concurrent identical /optimize and /extract-pdf requests share one computation;
+# followers give up (504) after these many seconds
+optimize_flight = SingleFlight("optimize", timeout=float(os.getenv("OPTIMIZE_FLIGHT_TIMEOUT", "120")))
+extract_flight = SingleFlight("extract", timeout=float(os.getenv("EXTRACT_FLIGHT_TIMEOUT", "300")))
+
+# Recent plans kept for incremental updates, oldest evicted first. Every
+# response gets its own plan id, but several ids can refer to the same plan
+# object: plans are never modified in place, /optimize/update gives its id an
+# updated copy (see update_plan). Plans are per process, which is why
+# gunicorn.conf.py runs a single worker by default.
+MAX_STORED_PLANS = 32
+stored_plans = OrderedDict()
+plans_lock = threading.Lock()
+
+def results_response(payload, castings, primary_name):
+    """
+    JSON response whose castings are encoded straight from the Casting objects.
+    With ?stream=1 the body is sent in chunks, one casting at a time.
+    """
+    chunks = iter_results_json(payload, castings, primary_name)
+    if request.args.get('stream') == '1':
+        return Response(stream_with_context(chunks), mimetype='application/json')
+    return Response(b''.join(chunks), mimetype='application/json')
+
+def compact_castings(castings, primary_name):
+    """
+    Encode castings in the compact response format: every distinct panel layout
+    is stored once in "layouts", and shapes and castings are columnar tables
+    that reference layouts and shapes by index.
+    """
+    layouts = []
+    layout_index = {}
+    shapes = {"names": [], "lengths": [], "layouts": []}
+    shape_index = {}
+    columns = {"names": [], "types": [], "shapes": []}
+
+    for casting in castings:
+        shape_refs = []
+        for shape in casting.shapes:
+            idx = shape_index.get(id(shape))
+            if idx is None:
+                side_layouts = []
+                for panels in shape.panel_layout:
+                    key = tuple(panels)
+                    if key not in layout_index:
+                        layout_index[key] = len(layouts)
+                        layouts.append(panels)
+                    side_layouts.append(layout_index[key])
+
+                idx = shape_index[id(shape)] = len(shapes["names"])
+                shapes["names"].append(shape.name)
+                shapes["lengths"].append(shape.sides)
+                shapes["layouts"].append(side_layouts)
+            shape_refs.append(idx)
+
+        columns["names"].append(casting.name)
+        columns["types"].append("PRIMARY" if casting.name == primary_name else "SECONDARY")
+        columns["shapes"].append(shape_refs)
+
+    return {"layouts": layouts, "shapes": shapes, "castings": columns}
+
+def wants_compact():
+    """Compact output is opt-in via ?format=compact or the Accept header."""
+    if request.args.get('format') == 'compact':
+        return True
+    accept = request.accept_mimetypes
+    return accept[COMPACT_MIMETYPE] > accept['application/json']
+
+def compressed_json(payload):
+    """JSON response compressed with brotli or gzip when the client accepts it."""
+    response = jsonify(payload)
+    response.mimetype = COMPACT_MIMETYPE
+    response.vary.add('Accept-Encoding')
+
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+
+    encodings = request.accept_encodings
+    if BROTLI_AVAILABLE and encodings['br']:
+        response.set_data(brotli.compress(body))
+        response.headers['Content-Encoding'] = 'br'
+    elif encodings['gzip']:
+        response.set_data(gzip.compress(body, compresslevel=6))
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+# Fingerprint of a finished /optimize request -> its plan, oldest evicted
+# first. Cached plans are never modified, so they are served without a lock.
+MAX_CACHED_RESULTS = 64
+result_cache = OrderedDict()
+
+def request_catalog(data):
+    """
+    Panel catalog from the optional "panelCatalog" request field
+    ({"sizes", "min", "max", "stock", "cost"}); None selects the default catalog.
+    """
+    catalog_data = data.get('panelCatalog')
+    return PanelCatalog.from_dict(catalog_data) if catalog_data else None
+
+def store_plan(plan):
+    """Store a plan under a new id, so each client edits its own copy."""
+    plan_id = uuid.uuid4().hex
+    with plans_lock:
+        stored_plans[plan_id] = {"plan": plan, "lock": threading.Lock()}
+        while len(stored_plans) > MAX_STORED_PLANS:
+            stored_plans.popitem(last=False)
+    return plan_id
+
+def cache_result(fingerprint, plan):
+    with plans_lock:
+        result_cache[fingerprint] = plan
+        while len(result_cache) > MAX_CACHED_RESULTS:
+            result_cache.popitem(last=False)
+
+def cached_result(fingerprint):
+    """The plan of a previously optimized identical request, or None."""
+    with plans_lock:
+        plan = result_cache.get(fingerprint)
+        if plan is not None:
+            result_cache.move_to_end(fingerprint)
+        return plan
+
+def result_etag(fingerprint, compact):
+    """ETag for an /optimize result; compact and regular bodies differ, so both are tagged."""
+    return f"{fingerprint[:32]}-{'compact' if compact else 'json'}"
+
+def plan_statistics(plan):
+    """Statistics fields of a plan's results, with custom-size consolidation if requested."""
+    results = {
+        "panel_stats": plan["stats"]["panel_stats"],
+        "reuse_analysis": plan["stats"]["reuse_analysis"]
+    }
+    if plan.get("custom_tolerance"):
+        counts = dict(plan["primary_panels"])
+        for size, count in plan["secondary_panels"].items():
+            counts[size] = counts.get(size, 0) + count
+        results["consolidation"] = consolidate_custom_panels(
+            counts, plan["custom_tolerance"], plan["catalog"])
+    return results
+
+def optimize_output(plan, plan_id, compact):
+    """Build the /optimize response for a plan."""
+    castings = plan["castings"]
+    primary_name = plan["primary"]
+    if compact:
+        output = {
+            "format": "compact",
+            "steps": OPTIMIZE_STEPS,
+            "plan_id": plan_id,
+            "results": {
+                "primary_casting": primary_name,
+                **compact_castings(castings, primary_name),
+                **plan_statistics(plan)
+            }
+        }
+        return compressed_json(output)
+
+    # Create output JSON structure; castings are encoded from the objects
+    output = {
+        "steps": OPTIMIZE_STEPS,
+        "plan_id": plan_id,
+        "results": {
+            "primary_casting": primary_name,
+            **plan_statistics(plan)
+        }
+    }
+    return results_response(output, castings, primary_name)
+
 @app.route('/optimize', methods=['POST'])
 def optimize():
     try:
         data = request.json
         castings_data = data['castings']
         primary_casting_name = data['primaryCasting']
+        catalog = request_catalog(data)
+        # Optionally choose layouts that use the catalog's stock before buying,
+        # and report how custom sizes consolidate within a tolerance (mm)
+        use_stock = bool(data.get('useStock'))
+        custom_tolerance = data.get('customTolerance')
+        options = {name: data[name] for name in ('useStock', 'customTolerance') if data.get(name)}
 
         # Convert JSON data to Casting objects
         castings = []
@@ -70,142 +311,198 @@ def optimize():
         primary_idx = next(i for i, c in enumerate(castings) 
                          if c.name == primary_casting_name)
 
-        # Run optimization
-        optimize_panels(castings, primary_idx)
+        # Identical requests (same castings, primary and panel configuration)
+        # are answered from the stored plan, or with 304 if the client has it
+        compact = wants_compact()
+        fingerprint = input_fingerprint(castings, primary_casting_name, catalog, options)
+        etag = result_etag(fingerprint, compact)
+        plan = cached_result(fingerprint)
+        if plan is not None:
+            metrics.increment("result_cache_hits_total")
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = optimize_output(plan, store_plan(plan), compact)
+            response.set_etag(etag, weak=True)
+            return response
+        metrics.increment("result_cache_misses_total")
+
+        def run():
+            # Repeated floors share their shapes, so layouts are computed once
+            dedupe_shapes(castings)
+
+            # Run optimization, keeping the plan around for incremental updates
+            plan = create_plan(castings, primary_idx, catalog, use_stock)
+            if custom_tolerance:
+                plan["custom_tolerance"] = int(custom_tolerance)
+            cache_result(fingerprint, plan)
+            return plan
+
+        # Identical requests arriving together wait for one optimization, and
+        # each gets its own plan id
+        plan = optimize_flight.do(fingerprint, run)
+
+        response = optimize_output(plan, store_plan(plan), compact)
+        response.set_etag(etag, weak=True)
+        return response
+
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except TimeoutError as e:
+        return jsonify({'error': str(e)}), 504
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        # Create output JSON structure
-        output = {
-            "steps": [
-                "Optimizing panel layouts...",
-                "Step 1/4: Collecting all side lengths across castings",
-                "Step 2/4: Creating a panel plan that ensures 100% reuse",
-                "Step 3/4: Selecting optimal panel combinations",
-                "Step 4/4: Applying panel layouts to all castings"
-            ],
-            "results": {
-                "primary_casting": castings[primary_idx].name,
-                "castings": []
+@app.route('/optimize/update', methods=['POST'])
+def optimize_update():
+    """
+    Apply edits to a previously optimized plan. Only the touched castings are
+    re-optimized and returned, together with the updated statistics.
+    """
+    try:
+        data = request.json
+        with plans_lock:
+            entry = stored_plans.get(data['planId'])
+            if entry is not None:
+                stored_plans.move_to_end(data['planId'])
+        if entry is None:
+            return jsonify({'error': 'Unknown or expired plan, please run the full optimization again'}), 404
+
+        with entry["lock"]:
+            # The stored plan may also be another client's or a cached result,
+            # so the update goes to a copy; a failing batch changes nothing
+            plan = dict(entry["plan"])
+            delta = update_plan(plan, data['changes'])
+            entry["plan"] = plan
+            changed = [c for c in plan["castings"] if c.name in delta["changed"]]
+            if wants_compact():
+                output = {
+                    "format": "compact",
+                    "plan_id": data['planId'],
+                    "results": {
+                        "primary_casting": plan["primary"],
+                        **compact_castings(changed, plan["primary"]),
+                        "removed_castings": delta["removed"],
+                        **plan_statistics(plan)
+                    }
+                }
+                return compressed_json(output)
+
+            output = {
+                "plan_id": data['planId'],
+                "results": {
+                    "primary_casting": plan["primary"],
+                    "removed_castings": delta["removed"],
+                    **plan_statistics(plan)
+                }
             }
-        }
+            body = b''.join(iter_results_json(output, changed, plan["primary"]))
 
-        # Process all castings
-        for i, casting in enumerate(castings):
-            casting_data = {
-                "name": casting.name,
-                "type": "PRIMARY" if i == primary_idx else "SECONDARY",
-                "shapes": []
-            }
+        return Response(body, mimetype='application/json')
 
-            for shape in casting.shapes:
-                shape_data = {
-                    "name": shape.name,
-                    "sides": []
-                }
-                
-                for side_idx, (length, panels) in enumerate(zip(shape.sides, shape.panel_layout)):
-                    side_data = {
-                        "number": side_idx + 1,
-                        "length": length,
-                        "panels": panels
-                    }
-                    shape_data["sides"].append(side_data)
-                
-                casting_data["shapes"].append(shape_data)
-            
-            output["results"]["castings"].append(casting_data)
-
-        # Calculate panel statistics
-        panel_stats = {
-            "standard": {},
-            "custom": {},
-            "totals": {
-                "total_types": 0,
-                "standard_types": 0,
-                "custom_types": 0
-            }
-        }
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        # Track panel usage
-        all_panels = {}
-        primary_panels = {}
-        secondary_panels = {}
-
-        # Process primary casting panels
-        for shape in castings[primary_idx].shapes:
-            for panels in shape.panel_layout:
-                for panel in panels:
-                    primary_panels[panel] = primary_panels.get(panel, 0) + 1
-                    all_panels[panel] = all_panels.get(panel, 0) + 1
-
-        # Process secondary castings
-        for i, casting in enumerate(castings):
-            if i != primary_idx:
-                for shape in casting.shapes:
-                    for panels in shape.panel_layout:
-                        for panel in panels:
-                            secondary_panels[panel] = secondary_panels.get(panel, 0) + 1
-                            all_panels[panel] = all_panels.get(panel, 0) + 1
-
-        # Calculate panel statistics
-        for size, count in all_panels.items():
-            if size in STANDARD_PANEL_SIZES:
-                panel_stats["standard"][str(size)] = count
-            else:
-                panel_stats["custom"][str(size)] = count
+@app.route('/primary-ranking', methods=['POST'])
+def primary_ranking():
+    """
+    Rank every casting of a stored plan as the primary: {planId, pairwise}
+    -> new panels and reuse efficiency per candidate, best first, plus the
+    casting-to-casting reuse matrix when pairwise is set.
+    """
+    try:
+        from reuse_matrix import rank_primaries
 
-        panel_stats["totals"] = {
-            "total_types": len(all_panels),
-            "standard_types": len([p for p in all_panels if p in STANDARD_PANEL_SIZES]),
-            "custom_types": len([p for p in all_panels if p not in STANDARD_PANEL_SIZES])
-        }
+        data = request.json
+        with plans_lock:
+            entry = stored_plans.get(data['planId'])
+        if entry is None:
+            return jsonify({'error': 'Unknown or expired plan, please run the full optimization again'}), 404
+
+        with entry["lock"]:
+            plan = entry["plan"]
+            result = rank_primaries(plan["castings"], plan["catalog"], bool(data.get('pairwise')))
+        return jsonify(result)
+
+    except KeyError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        # Calculate reuse analysis
-        reuse_analysis = {
-            "new_panels": [],
-            "totals": {
-                "standard_new": 0,
-                "custom_new": 0,
-                "total_new": 0
-            }
-        }
+@app.route('/cutting-plan', methods=['POST'])
+def cutting_plan():
+    """
+    Cut list for the custom panels of a stored plan: {planId, stockLength,
+    kerf, improve} -> boards grouped by cutting pattern with their waste.
+    """
+    try:
+        data = request.json
+        with plans_lock:
+            entry = stored_plans.get(data['planId'])
+        if entry is None:
+            return jsonify({'error': 'Unknown or expired plan, please run the full optimization again'}), 404
+
+        with entry["lock"]:
+            demand = custom_panel_demand(entry["plan"]["primary_panels"], entry["plan"]["stats"])
+        result = plan_cuts(demand,
+                           stock_length=int(data.get('stockLength', DEFAULT_STOCK_LENGTH)),
+                           kerf=int(data.get('kerf', 0)),
+                           improve=bool(data.get('improve', True)))
+        return jsonify(result)
+
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        # Calculate new panels needed
-        for panel, count in secondary_panels.items():
-            available = primary_panels.get(panel, 0)
-            if count > available:
-                new_count = count - available
-                panel_type = "standard" if panel in STANDARD_PANEL_SIZES else "custom"
-                reuse_analysis["new_panels"].append({
-                    "size": panel,
-                    "type": panel_type,
-                    "count": new_count
-                })
-                if panel_type == "standard":
-                    reuse_analysis["totals"]["standard_new"] += new_count
-                else:
-                    reuse_analysis["totals"]["custom_new"] += new_count
-
-        reuse_analysis["totals"]["total_new"] = (
-            reuse_analysis["totals"]["standard_new"] + 
-            reuse_analysis["totals"]["custom_new"]
-        )
-
-        # Calculate efficiency
-        total_secondary = sum(secondary_panels.values())
-        total_new = reuse_analysis["totals"]["total_new"]
-        reused = total_secondary - total_new
-        
-        reuse_analysis["efficiency"] = {
-            "percentage": round((reused / total_secondary * 100), 1) if total_secondary > 0 else 0,
-            "reused_panels": reused,
-            "total_panels": total_secondary
-        }
+@app.route('/project/save', methods=['POST'])
+def project_save():
+    """Optimize the posted castings and return them as a binary project file."""
+    try:
+        data = request.json
+        project = Project.from_dicts(data['castings'])
+        catalog = request_catalog(data)
+        plan = optimize_project(project, OptimizeConfig(data['primaryCasting'], catalog))
+
+        buffer = BytesIO()
+        write_project(buffer, plan.to_castings(), project.index(data['primaryCasting']),
+                      plan.stats_dict(), catalog)
+        buffer.seek(0)
+        return send_file(buffer, mimetype='application/octet-stream',
+                         as_attachment=True, download_name='project.cproj')
+
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
-        output["results"]["panel_stats"] = panel_stats
-        output["results"]["reuse_analysis"] = reuse_analysis
+@app.route('/project/load', methods=['POST'])
+def project_load():
+    """
+    Read an uploaded project file and return results in the /optimize format,
+    re-optimizing only if the stored layouts are stale.
+    """
+    try:
+        if 'projectFile' not in request.files:
+            return jsonify({'error': 'No file part'}), 400
 
-        return jsonify(output)
+        project = ensure_optimized(read_project(request.files['projectFile'].read()))
+        castings = project["castings"]
+        primary_name = castings[project["primary_idx"]].name
+        output = {
+            "steps": [],
+            "results": {
+                "primary_casting": primary_name,
+                "panel_stats": project["stats"]["panel_stats"],
+                "reuse_analysis": project["stats"]["reuse_analysis"]
+            }
+        }
+        return results_response(output, castings, primary_name)
 
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -215,6 +512,9 @@ def extract_pdf():
         return jsonify({'error': 'PaddleOCR is not installed on the server. Please install with: pip install paddleocr pillow'}), 500
     
     try:
+        # Bodies past the upload limit are refused before they are read
+        request.max_content_length = MAX_REQUEST_BYTES
+
         # Check if file exists in request
         if 'pdfFile' not in request.files:
             return jsonify({'error': 'No file part'}), 400
@@ -223,272 +523,108 @@ def extract_pdf():
         if pdf_file.filename == '':
             return jsonify({'error': 'No selected file'}), 400
 
-        # Create temporary file to store the uploaded PDF
-        temp_pdf = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
-        pdf_file.save(temp_pdf.name)
-        temp_pdf.close()
-        
-        # Process the PDF
-        MIN_AREA = 5000
+        # Small uploads stay in memory, larger ones are spooled to a temporary
+        # file that is removed however the request ends
+        with SpooledUpload(MAX_UPLOAD_BYTES, UPLOAD_SPOOL_BYTES) as upload:
+            upload.copy_from(pdf_file.stream)
+            metrics.observe("extract_upload_bytes", upload.size,
+                            storage="memory" if upload.in_memory else "disk")
+
+            # Identical uploads in flight together share one extraction
+            payload, status = extract_flight.do(upload.digest, extract_castings, upload)
+        return jsonify(payload), status
+
+    except (UploadTooLarge, RequestEntityTooLarge):
+        return jsonify({'error': f'The PDF is larger than the {MAX_UPLOAD_BYTES / (1 << 20):g} MB upload limit. Please upload a smaller file.'}), 413
+    except TimeoutError as e:
+        log.error("Extraction timed out: %s", e)
+        return jsonify({'error': f'{str(e)}. Please try again.'}), 504
+    except Exception as e:
+        log.exception("Unhandled error in extract-pdf: %s", e)
         
+        return jsonify({'error': f'An unexpected error occurred: {str(e)}. Please try again.'}), 500
+
+def extract_castings(upload):
+    """
+    Run the extraction pipeline on an uploaded PDF (a SpooledUpload).
+    Returns the (payload, status) of the /extract-pdf response.
+    """
+    try:
+        doc = upload.open_pdf()
         try:
-            doc = fitz.open(temp_pdf.name)
             page = doc[0]  # Assuming we're processing only the first page
-            
-            # Extract drawings
-            drawings = page.get_drawings()
-            print(f"Found {len(drawings)} drawings in PDF")
-            
-            # Define color matching function
-            def is_target_color(color, target=(1.0, 1.0, 0.49803900718688965), tol=0.05):
-                """Check if color is within tolerance of target color"""
-                if color is None:
-                    return False
-                return all(abs(c - t) < tol for c, t in zip(color, target))
-            
-            # Find target rectangles
-            target_rectangles = []
-            for drawing in drawings:
-                stroke_color = drawing.get("color")
-                if not is_target_color(stroke_color):
-                    continue
-                for item in drawing["items"]:
-                    if item[0] == "re":
-                        rect = item[1]
-                        area = rect.width * rect.height
-                        if area >= MIN_AREA:
-                            target_rectangles.append(rect)
-            
-            print(f"Found {len(target_rectangles)} target colored rectangles")
-            
-            # Process with more lenient color matching if needed
-            if len(target_rectangles) == 0:
-                for drawing in drawings:
-                    stroke_color = drawing.get("color")
-                    if stroke_color and any(c > 0.9 for c in stroke_color):  # Any bright color
-                        for item in drawing["items"]:
-                            if item[0] == "re":
-                                rect = item[1]
-                                area = rect.width * rect.height
-                                if area >= MIN_AREA:
-                                    target_rectangles.append(rect)
-                print(f"After lenient matching: Found {len(target_rectangles)} bright colored rectangles")
-            
-            # Last resort: get largest rectangles regardless of color
-            if len(target_rectangles) == 0:
-                all_rectangles = []
-                for drawing in drawings:
-                    for item in drawing["items"]:
-                        if item[0] == "re":
-                            rect = item[1]
-                            area = rect.width * rect.height
-                            if area >= MIN_AREA:
-                                all_rectangles.append(rect)
-                
-                all_rectangles = sorted(all_rectangles, key=lambda r: r.width * r.height, reverse=True)
-                target_rectangles = all_rectangles[:4] if len(all_rectangles) >= 4 else all_rectangles
-                print(f"Fallback: Selected {len(target_rectangles)} largest rectangles")
-            
-            # Sort and limit number of rectangles
-            target_rectangles = sorted(target_rectangles, key=lambda r: r.width * r.height, reverse=True)
-            if len(target_rectangles) > 4:  # Limit to top 4 largest rectangles
-                target_rectangles = target_rectangles[:4]
+            target_rectangles = find_casting_rectangles(page)
             
             # If no rectangles found at all
             if len(target_rectangles) == 0:
-                doc.close()
-                os.unlink(temp_pdf.name)
-                return jsonify({'error': 'Could not identify casting areas in the PDF. Please check the PDF format or try manual input.'}), 400
-            
-            # Initialize OCR - handle environment variable to avoid OpenMP error
-            os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
-            print("Initializing PaddleOCR...")
+                return {'error': 'Could not identify casting areas in the PDF. Please check the PDF format or try manual input.'}, 400
             
             try:
-                # Use minimal configuration to avoid errors
-                ocr = PaddleOCR(use_angle_cls=True, lang='en', show_log=False)
-                print("✓ PaddleOCR initialized successfully")
+                ocr = get_ocr()
             except Exception as e:
-                doc.close()
-                os.unlink(temp_pdf.name)
-                print(f"OCR initialization error: {str(e)}")
-                return jsonify({'error': f'OCR initialization failed: {str(e)}. Please try manual input.'}), 500
-            
-            # Process each rectangle - directly in memory without saving to files
-            casting_data = ""
-            dpi = 300
+                log.error("OCR initialization error: %s", e)
+                return {'error': f'OCR initialization failed: {str(e)}. Please try manual input.'}, 500
             
+            # Render every region first, so their text crops are recognized together
+            images = []
             for idx, rect in enumerate(target_rectangles):
+                log.info("Processing rectangle %d/%d", idx + 1, len(target_rectangles))
                 try:
-                    print(f"Processing rectangle {idx + 1}/{len(target_rectangles)}")
-                    
-                    # Extract image from PDF as pixmap
-                    pix = page.get_pixmap(clip=rect, dpi=dpi)
-                    
-                    # Convert the pixmap to a PIL Image
-                    imgbytes = BytesIO(pix.tobytes("png"))
-                    img = Image.open(imgbytes)
-                    
-                    # Convert to numpy array (what PaddleOCR expects)
-                    img_array = np.array(img)
-                    
-                    # Ensure image is in RGB format
-                    if len(img_array.shape) == 3 and img_array.shape[2] == 4:  # RGBA
-                        img_array = cv2.cvtColor(img_array, cv2.COLOR_RGBA2RGB)
-                    elif len(img_array.shape) == 3 and img_array.shape[2] == 3:  # Already RGB
-                        pass
-                    else:  # Grayscale
-                        img_array = cv2.cvtColor(img_array, cv2.COLOR_GRAY2RGB)
-                    
-                    # Process image with OCR directly
-                    results = ocr.ocr(img_array, cls=True)
-                    
-                    pillar_name = ""
-                    casting_output = []
-                    
-                    if results and len(results) > 0 and results[0] is not None:
-                        for line in results:
-                            if line is None:
-                                continue
-                            for word_info in line:
-                                if word_info is None:
-                                    continue
-                                
-                                # Extract text from word_info
-                                try:
-                                    _, (text, confidence) = word_info
-                                    
-                                    # Skip low confidence results
-                                    if confidence < 0.5:
-                                        continue
-                                    
-                                    print(f"OCR found: '{text}' (confidence: {confidence:.2f})")
-                                    
-                                    # Look for casting names
-                                    if any(key in text.upper() for key in ['SW', 'LSW', 'LIFT']):
-                                        pillar_name = text.strip().replace('\n', '').replace(' ', '')
-                                        print(f"Found pillar name: {pillar_name}")
-                                    
-                                    # Look for dimensions (with X or x)
-                                    elif any(sep in text.upper() for sep in ['X', 'x', '*']) and pillar_name:
-                                        dimension = text.strip().replace('\n', '').replace(' ', '')
-                                        casting_output.append(f"{pillar_name} : {dimension}")
-                                        print(f"Found dimension: {pillar_name} : {dimension}")
-                                        pillar_name = ""  # Reset for next pair
-                                        
-                                except Exception as parse_error:
-                                    print(f"Error parsing OCR result: {parse_error}")
-                                    continue
-                        
-                        if casting_output:
-                            casting_data += f"Casting {idx + 1} :\n"
-                            for line in casting_output:
-                                casting_data += f"{line}\n"
-                            casting_data += "\n"
-                            print(f"Added casting data for rectangle {idx + 1}")
-                    else:
-                        print(f"No OCR results for rectangle {idx + 1}")
-                    
+                    with metrics.timer("extract_stage_seconds", stage="rasterize"):
+                        images.append(render_region(page, rect))
                 except Exception as e:
-                    print(f"Error processing rectangle {idx + 1}: {str(e)}")
+                    log.warning("Error processing rectangle %d: %s", idx + 1, e)
                     # Continue to the next rectangle on error
-                    continue
-            
-            # Close PDF and clean up temp file
-            doc.close()
-            os.unlink(temp_pdf.name)
-            
-            print(f"Final extracted casting data:\n{casting_data}")
+                    images.append(None)
             
-            # If no casting data was extracted
-            if not casting_data:
-                return jsonify({'error': 'Could not extract casting data from the PDF. The PDF might not contain readable text, or the casting format might be different. Please try manual input or a different PDF.'}), 400
+            # The upload and the rendered regions are the request's largest buffers
+            buffer_bytes = upload.memory_bytes + sum(img.nbytes for img in images if img is not None)
+            metrics.observe("extract_buffer_bytes", buffer_bytes)
+            log.info("Holding %.1f MB of upload and region images", buffer_bytes / (1 << 20))
             
-            # Check if Gemini API is available
-            if not GEMINI_API_KEY:
-                return jsonify({'error': 'Gemini API key not configured. Please set up GEMINI_API_KEY in environment variables.'}), 500
-            
-            # Process with Gemini API
-            genai.configure(api_key=GEMINI_API_KEY)
-            
-            # Create prompt for Gemini 
-            prompt = f"""
-            You are a highly accurate JSON generator.
-
-            You will be given casting data in the following format:
-            Casting N :
-            SHAPE_NAME : WIDTHxHEIGHT
-
-            Your task is to convert this to a JSON with this structure:
-
-            {{
-              "casting_1": {{
-                "SW2": {{
-                  "side_1": 4750,
-                  "side_2": 250
-                }}
-              }},
-              "casting_2": {{
-                "SW3": {{
-                  "side_1": 1200,
-                  "side_2": 600
-                }}
-              }}
-            }}
-
-            Rules:
-            - Use the shape name (e.g., SW2, LSW4) as keys.
-            - Parse the sizes into integers: width → side_1, height → side_2.
-            - Handle various dimension separators (x, X, *, etc.)
-            - Remove any spaces or non-numeric characters from dimensions
-            - Use JSON syntax only — no explanations, comments, or extra text.
-            - If multiple castings exist, number them as casting_1, casting_2, etc.
-
-            Now convert the following data into JSON:
-
-            {casting_data}
-            """
+            with ocr_lock, metrics.timer("extract_stage_seconds", stage="ocr"):
+                regions = recognize_regions(ocr, images, OCR_FULL_DETECTION)
+            for idx, casting_output in enumerate(regions):
+                if casting_output:
+                    log.info("Added casting data for rectangle %d", idx + 1)
+        finally:
+            doc.close()
+            # The upload is not needed past this point; release it before the LLM call
+            upload.close()
+        
+        casting_data = format_casting_data(regions)
+        log.debug("Final extracted casting data:\n%s", casting_data)
+        
+        # If no casting data was extracted
+        if not casting_data:
+            return {'error': 'Could not extract casting data from the PDF. The PDF might not contain readable text, or the casting format might be different. Please try manual input or a different PDF.'}, 400
+        
+        # Shared client: configured once, with timeouts, retries and a concurrency cap
+        llm = get_llm_client()
+        if llm is None:
+            return {'error': 'Gemini API key not configured. Please set up GEMINI_API_KEY in environment variables.'}, 500
+        prompt = build_prompt(casting_data)
+        
+        # Generate content with Gemini
+        raw_response = None
+        try:
+            raw_response = llm.generate(prompt)
+            json_data = parse_llm_response(raw_response)
             
-            # Generate content with Gemini
-            try:
-                model = genai.GenerativeModel('gemini-2.0-flash')
-                response = model.generate_content(prompt)
-                raw_response = response.text
-                cleaned_response = re.sub(r"^```(?:json)?\s*|\s*```$", "", raw_response.strip())
-                
-                print(f"Gemini response: {cleaned_response}")
-                
-                # Parse JSON response
-                json_data = json.loads(cleaned_response)
-                
-                # Validate JSON structure
-                if not json_data or not isinstance(json_data, dict):
-                    raise ValueError("Invalid JSON structure received from Gemini")
-                
-                print("✓ Successfully processed PDF and generated JSON")
-                # Return the processed data
-                return jsonify(json_data)
-                
-            except json.JSONDecodeError as e:
-                print(f"JSON parsing error: {str(e)}")
-                print(f"Raw response: {raw_response}")
-                return jsonify({'error': f'Failed to parse Gemini response as JSON: {str(e)}. Please try manual input.'}), 500
-            except Exception as e:
-                print(f"Error with Gemini processing: {str(e)}")
-                return jsonify({'error': f'Gemini processing failed: {str(e)}. Please try manual input.'}), 500
+            log.info("Successfully processed PDF and generated JSON")
+            # Return the processed data
+            return json_data, 200
             
+        except json.JSONDecodeError as e:
+            log.error("JSON parsing error: %s", e, extra={"context": {"raw_response": raw_response}})
+            return {'error': f'Failed to parse Gemini response as JSON: {str(e)}. Please try manual input.'}, 500
         except Exception as e:
-            print(f"Error processing PDF: {str(e)}")
-            if os.path.exists(temp_pdf.name):
-                os.unlink(temp_pdf.name)
-            raise e
-
-    except Exception as e:
-        import traceback
-        print(f"Unhandled error in extract-pdf: {str(e)}")
-        print(traceback.format_exc())
+            log.error("Error with Gemini processing: %s", e)
+            return {'error': f'Gemini processing failed: {str(e)}. Please try manual input.'}, 500
         
-        return jsonify({'error': f'An unexpected error occurred: {str(e)}. Please try again.'}), 500
+    except Exception as e:
+        log.error("Error processing PDF: %s", e)
+        raise e
 
 # Test route to check if PaddleOCR is working
 @app.route('/test-ocr', methods=['GET'])
@@ -498,9 +634,10 @@ def test_ocr():
         return jsonify({'status': 'error', 'message': 'PaddleOCR not available'}), 500
     
     try:
-        # Initialize OCR
-        os.environ["KMP_DUPLICATE_LIB_OK"] = "TRUE"
-        ocr = PaddleOCR(use_angle_cls=True, lang='en', show_log=False)
+        import numpy as np
+
+        # Initialize OCR (or reuse the shared instance)
+        ocr = get_ocr()
         
         # Create a simple test image with text
         img = np.ones((100, 300, 3), dtype=np.uint8) * 255  # White background
@@ -519,4 +656,6 @@ def test_ocr():
         }), 500
 
 if __name__ == '__main__':
+    # Development server; production runs wsgi.py under gunicorn (see gunicorn.conf.py)
+    app.config['READY'] = True
     app.run(debug=True, port=5000)
\ No newline at end of file
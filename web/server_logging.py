@@ -0,0 +1,93 @@
+"""
+Structured logging for the web server.
+
+Records are tagged with the id of the request that produced them and written
+as one JSON object per line. Handlers only put records on a queue; a single
+background listener thread does the formatting and the stream I/O, so request
+threads never block on stdout/stderr and lines do not interleave.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import time
+
+# Id of the request being handled on the current thread/task
+request_id_var = contextvars.ContextVar('request_id', default='-')
+
+LOGGER_NAMES = ('panel_optimizer', 'server')
+
+
+class RequestContextFilter(logging.Filter):
+    """Attach the current request id to every record."""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as single-line JSON. Pass extra={"context": {...}} for fields."""
+
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, 'request_id', '-'),
+            "message": record.getMessage()
+        }
+        context = getattr(record, 'context', None)
+        if context:
+            entry.update(context)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+# (queue handler, listener) installed by the last setup_logging() call
+_installed = None
+
+
+def setup_logging(level=None, stream=None):
+    """
+    Route the optimizer and server loggers through a queue to a background
+    listener. The level defaults to the LOG_LEVEL environment variable, or
+    WARNING, which keeps the optimizer library silent for normal requests.
+    Returns the started QueueListener.
+
+    The listener thread does not survive fork(), so a forked worker must call
+    this again (see gunicorn.conf.py); the previous handler is replaced.
+    """
+    global _installed
+    level = level or os.getenv('LOG_LEVEL', 'WARNING')
+
+    if _installed is not None:
+        old_handler, old_listener = _installed
+        for name in LOGGER_NAMES:
+            logging.getLogger(name).removeHandler(old_handler)
+        atexit.unregister(old_listener.stop)
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JSONFormatter())
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    # The filter runs on the request thread so the context var is still set
+    queue_handler.addFilter(RequestContextFilter())
+
+    for name in LOGGER_NAMES:
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        logger.addHandler(queue_handler)
+        logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    _installed = (queue_handler, listener)
+    return listener
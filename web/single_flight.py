@@ -0,0 +1,64 @@
+"""
+Single-flight execution of identical concurrent requests.
+
+When several identical requests arrive together (a team opening the same
+project, a double-clicked button), only the first one runs the computation.
+The others wait for it and share its result, or its exception. Once the call
+finishes the key is forgotten, so later requests compute afresh; caching
+finished results is the job of the caller (e.g. the /optimize result cache).
+
+Waiting is bounded per key: a follower that waits longer than the timeout
+gets a TimeoutError instead of hanging behind a stuck leader.
+"""
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+try:
+    from .instrumentation import metrics
+except ImportError:
+    from instrumentation import metrics
+
+
+class SingleFlight:
+    def __init__(self, group: str, timeout: float = None):
+        self.group = group
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> Future of the running call
+
+    def do(self, key, func, *args, timeout: float = None):
+        """
+        Return func(*args), sharing one call between concurrent callers with
+        the same key. timeout (default: the group's) bounds how long a
+        follower waits for the leader; None waits indefinitely.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+
+        if not leader:
+            metrics.increment("singleflight_coalesced_total", group=self.group)
+            wait = self.timeout if timeout is None else timeout
+            try:
+                return future.result(timeout=wait)
+            except FutureTimeoutError:
+                metrics.increment("singleflight_timeouts_total", group=self.group)
+                raise TimeoutError(f"Timed out after {wait:g}s waiting for an identical {self.group} request") from None
+
+        metrics.increment("singleflight_leaders_total", group=self.group)
+        try:
+            result = func(*args)
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,90 @@
+"""
+Memory-bounded handling of uploaded PDFs.
+
+SpooledUpload copies an upload stream in chunks, enforcing a maximum size
+while it reads. Small files stay in memory and are opened by PyMuPDF straight
+from the bytes. Past the spool size the data is moved to a temporary file,
+which PyMuPDF opens by path, so large drawings are never held in full. The
+SHA-256 of the contents is computed on the way, for de-duplication. The
+temporary file is removed on close(), including when the copy fails, so use
+the upload as a context manager.
+"""
+import hashlib
+import os
+import tempfile
+
+CHUNK_SIZE = 1 << 20
+
+
+class UploadTooLarge(ValueError):
+    def __init__(self, max_size: int):
+        super().__init__(f"The PDF is larger than the {max_size / (1 << 20):g} MB upload limit")
+        self.max_size = max_size
+
+
+class SpooledUpload:
+    def __init__(self, max_size: int, spool_size: int):
+        self.max_size = max_size
+        self.spool_size = spool_size
+        self.size = 0
+        self.digest = None
+        self.data = bytearray()  # contents while in memory
+        self.path = None         # temporary file once rolled over
+        self._file = None
+
+    @property
+    def in_memory(self) -> bool:
+        return self.path is None
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes of the upload held in memory."""
+        return len(self.data)
+
+    def copy_from(self, stream):
+        """Read stream to the end; raises UploadTooLarge past max_size."""
+        digest = hashlib.sha256()
+        try:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                self.size += len(chunk)
+                if self.size > self.max_size:
+                    raise UploadTooLarge(self.max_size)
+                digest.update(chunk)
+                if self.in_memory and self.size > self.spool_size:
+                    self._roll_over()
+                if self.in_memory:
+                    self.data += chunk
+                else:
+                    self._file.write(chunk)
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+        self.digest = digest.hexdigest()
+        return self
+
+    def _roll_over(self):
+        self._file = tempfile.NamedTemporaryFile(delete=False, suffix='.pdf')
+        self.path = self._file.name
+        self._file.write(self.data)
+        self.data = bytearray()
+
+    def open_pdf(self):
+        """Open the upload with PyMuPDF, from memory or from the temporary file."""
+        import fitz  # PyMuPDF
+
+        if self.in_memory:
+            return fitz.open(stream=self.data, filetype="pdf")
+        return fitz.open(self.path, filetype="pdf")
+
+    def close(self):
+        self.data = bytearray()
+        if self.path is not None and os.path.exists(self.path):
+            os.unlink(self.path)
+        self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
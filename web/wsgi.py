@@ -0,0 +1,57 @@
+"""
+Production entry point: gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing this module warms the process up before gunicorn forks its workers
+(preload_app): the layout cache is filled for every side length in the
+configured range and then shared copy-on-write by all workers. /ready only
+reports ready once warm-up has finished.
+
+PaddleOCR is not loaded in the master: its native runtime and threads are not
+fork-safe. With WARMUP_OCR=1 each worker loads it in warm_up_worker(), which
+gunicorn.conf.py calls after the fork and before the worker serves requests.
+
+Environment:
+    WARMUP_MIN_LENGTH, WARMUP_MAX_LENGTH, WARMUP_STEP
+        side lengths (mm) to precompute layouts for (default 100-6000 every 10)
+    WARMUP_OCR=1
+        load the OCR models in every worker before it serves requests
+"""
+import gc
+import logging
+import os
+import time
+
+from server import app, get_ocr, PADDLE_OCR_AVAILABLE
+from demo_last_saved import get_possible_panels
+
+log = logging.getLogger("server")
+
+
+def warm_up():
+    """Fill the shared caches; returns the number of side lengths precomputed."""
+    start = time.perf_counter()
+    lengths = range(int(os.getenv("WARMUP_MIN_LENGTH", "100")),
+                    int(os.getenv("WARMUP_MAX_LENGTH", "6000")) + 1,
+                    int(os.getenv("WARMUP_STEP", "10")))
+    for length in lengths:
+        get_possible_panels(length)
+
+    log.info("Warm-up finished in %.2fs (%d side lengths)", time.perf_counter() - start, len(lengths))
+    return len(lengths)
+
+
+def warm_up_worker():
+    """Per-worker warm-up, run after the fork: loads the OCR models with WARMUP_OCR=1."""
+    if os.getenv("WARMUP_OCR", "0") == "1":
+        if PADDLE_OCR_AVAILABLE:
+            get_ocr()
+        else:
+            log.warning("WARMUP_OCR is set but PaddleOCR is not installed")
+
+
+warm_up()
+
+# Move everything allocated so far out of the collector's generations, so the
+# workers' garbage collections do not touch (and un-share) the warmed pages
+gc.freeze()
+app.config['READY'] = True